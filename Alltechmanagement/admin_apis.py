@@ -1,10 +1,13 @@
 import logging
 
+from collections import Counter
+from contextlib import nullcontext
+
 from django.core.cache import cache
-from django.db.models import Sum, Count, Avg, F, Max, Min
+from django.db.models import F, Sum, Count, Max, Min, Q, IntegerField
 from django.db.models.functions import (
-     TruncWeek, TruncMonth,
-    ExtractHour, ExtractDay, ExtractMonth, ExtractYear,
+     TruncWeek, TruncMonth, NullIf, Cast,
+    ExtractDay, ExtractMonth, ExtractYear,
 
 )
 from rest_framework.decorators import api_view, permission_classes, throttle_classes, authentication_classes
@@ -16,12 +19,107 @@ from datetime import timedelta
 from django.core.exceptions import ValidationError
 from django.db.utils import DatabaseError
 
+from Alltechmanagement.cache_utils import get_or_compute, mark_stale, is_fresh, freshness_keys
 from Alltechmanagement.clerk_auth_class import ClerkAuthentication
-from Alltechmanagement.models import RECEIPTS2_FIX
+from Alltechmanagement.dashboard import dashboard_windows, main_dashboard_metrics
+from Alltechmanagement.models import DailySalesRollup, HourlySalesRollup, DailyProductRollup, \
+    DailyCustomerRollup, ProductCustomerRollup, SALE_SUMMARY_FIX, LcdCustomers
+from Alltechmanagement.stock_ledger import movement_history, movement_summary
 from Alltechmanagement.throttles import  DashBoardThrottle
 
 logger = logging.getLogger('django')
 
+# Average order value over rollup rows: revenue divided by the number of receipts
+AVERAGE_ORDER_VALUE = Sum('gross_sales') / Sum('receipt_count')
+
+
+# Cached dashboard payloads live for an hour. While fresh, completed sales are patched
+# into them in place; once the reconciliation window closes they are recomputed in full
+DASHBOARD_CACHE_TIMEOUT = 3600
+DASHBOARD_RECONCILE_SECONDS = 15 * 60
+
+
+def get_dashboard_payload(cache_key, compute):
+    """
+    Serve a dashboard payload through the compute-once cache. A payload stays fresh
+    for the reconciliation window and only for the day it was computed for, so
+    "today" figures are never patched across midnight; a stale payload is served
+    while a single worker recomputes it.
+    """
+    return get_or_compute(
+        cache_key, compute,
+        fresh_for=DASHBOARD_RECONCILE_SECONDS,
+        keep_for=DASHBOARD_CACHE_TIMEOUT,
+        token=timezone.localdate()
+    )
+
+
+def _merge_counts(rows, key, counts, field):
+    """Attach a per-group count computed by a separate rollup query to each row"""
+    counts = dict(counts)
+    rows = list(rows)
+    for row in rows:
+        row[field] = counts.get(row[key], 0)
+    return rows
+
+
+TOP_CUSTOMERS = 20
+
+
+def _lcd_customer_totals(customers):
+    """
+    Per-customer spending figures read from the totals LcdCustomers maintains,
+    in the same shape as `_customer_totals`.
+    """
+    return customers.exclude(customer_name='null').values('customer_name', 'total_spent', 'total_items').annotate(
+        purchase_count=F('visit_count'),
+        average_order_value=F('total_spent') / NullIf(F('visit_count'), 0),
+        first_purchase=F('first_purchase_at'),
+        last_purchase=F('last_purchase_at')
+    ).order_by('-total_spent')
+
+
+def _customer_totals(rollups):
+    """Per-customer spending figures over a DailyCustomerRollup queryset"""
+    return rollups.values('customer_name').annotate(
+        total_spent=Sum('gross_sales'),
+        purchase_count=Sum('receipt_count'),
+        average_order_value=AVERAGE_ORDER_VALUE,
+        first_purchase=Min('first_purchased_at'),
+        last_purchase=Max('last_purchased_at'),
+        total_items=Sum('quantity')
+    )
+
+
+def _summary_performance(summaries, pairs):
+    """
+    Per-product performance read straight from SALE_SUMMARY_FIX rows (one per
+    product for the period: a year or all time)
+    """
+    performance = summaries.values('product_name').annotate(
+        total_revenue=F('gross_sales'),
+        units_sold=F('quantity'),
+        average_price=F('price_sum') / F('receipt_count'),
+        first_sale=F('first_sold_at'),
+        last_sale=F('last_sold_at'),
+        total_orders=F('receipt_count')
+    ).order_by('-gross_sales')
+    customers = pairs.values('product_name').annotate(
+        unique_customers=Count('customer_name', distinct=True)
+    ).values_list('product_name', 'unique_customers')
+    return _merge_counts(performance, 'product_name', customers, 'unique_customers')
+
+
+def _product_monthly_trends(rollups):
+    """Per-month, per-product revenue over a DailyProductRollup queryset"""
+    return rollups.annotate(
+        month=TruncMonth('date')
+    ).values('month', 'product_name').annotate(
+        revenue=Sum('gross_sales'),
+        units_sold=Sum('quantity'),
+        average_price=Sum('price_sum') / Sum('receipt_count')
+    ).order_by('month', '-revenue')
+
 def handle_database_errors(func):
     """Decorator for handling database-related errors"""
 
@@ -55,81 +153,12 @@ def handle_database_errors(func):
 def main_dashboard(request):
     """Main dashboard with key business metrics and overview"""
     try:
-        today = timezone.now().date()
+        today = timezone.localdate()
         current_year = today.year
         cache_key = f"DASHBOARD_{current_year}"
 
-        # Check if data is already cached
-        cached_data = cache.get(cache_key)
-
-        if cached_data is None:
-            # Today's metrics (current year only)
-            today_metrics = RECEIPTS2_FIX.objects.filter(
-                created_at__date=today,
-                created_at__year=current_year
-            ).aggregate(
-                sales_count=Count('id'),
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                total_items_sold=Sum('quantity'),
-                unique_customers=Count('customer_name', distinct=True)
-            )
-
-            # Initialize with zero if no data
-            for key in today_metrics:
-                if today_metrics[key] is None:
-                    today_metrics[key] = 0
-
-            # Compare with yesterday (current year)
-            yesterday = today - timedelta(days=1)
-            yesterday_metrics = RECEIPTS2_FIX.objects.filter(
-                created_at__date=yesterday,
-                created_at__year=current_year
-            ).aggregate(
-                total_sales=Sum(F('selling_price') * F('quantity'))
-            )
-
-            # Weekly comparison (current year)
-            current_week_start = today - timedelta(days=today.weekday())
-            last_week_start = current_week_start - timedelta(days=7)
-
-            current_week_sales = RECEIPTS2_FIX.objects.filter(
-                created_at__date__gte=current_week_start,
-                created_at__year=current_year
-            ).aggregate(
-                total_sales=Sum(F('selling_price') * F('quantity'))
-            )
-
-            last_week_sales = RECEIPTS2_FIX.objects.filter(
-                created_at__date__range=[last_week_start, current_week_start - timedelta(days=1)],
-                created_at__year=current_year
-            ).aggregate(
-                total_sales=Sum(F('selling_price') * F('quantity'))
-            )
-
-            # All-time totals for comparison
-            all_time_totals = RECEIPTS2_FIX.objects.aggregate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                total_orders=Count('id'),
-                total_customers=Count('customer_name', distinct=True)
-            )
-
-            # Prepare the response data
-            response_data = {
-                'current_year': current_year,
-                'today_metrics': today_metrics,
-                'yesterday_total_sales': yesterday_metrics['total_sales'] or 0,
-                'current_week_sales': current_week_sales['total_sales'] or 0,
-                'last_week_sales': last_week_sales['total_sales'] or 0,
-                'all_time_totals': all_time_totals
-            }
-
-            # Cache the data for 1 hour (3600 seconds)
-            cache.set(cache_key, response_data, timeout=3600)
-
-            return Response(response_data)
-        else:
-            # Return cached data
-            return Response(cached_data)
+        # Every window (today, yesterday, this week, last week, all time) in one pass
+        return Response(get_dashboard_payload(cache_key, lambda: main_dashboard_metrics(today)))
 
     except Exception as e:
         logger.error(str(e))
@@ -151,45 +180,50 @@ def weekly_analysis(request):
                 'error': 'Weeks parameter must be between 1 and 52'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        end_date = timezone.now().date()
+        end_date = timezone.localdate()
         start_date = end_date - timedelta(weeks=weeks)
         current_year = end_date.year
         cache_key = f"WEEKLY_ANALYSIS_{current_year}"
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
+        def compute():
             # Current year weekly data
-            weekly_data = RECEIPTS2_FIX.objects.filter(
-                created_at__date__range=[start_date, end_date],
-                created_at__year=current_year
+            weekly_data = DailySalesRollup.objects.filter(
+                date__range=[start_date, end_date],
+                date__year=current_year
             ).annotate(
-                week=TruncWeek('created_at')
+                week=TruncWeek('date')
             ).values('week').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
-                total_orders=Count('id'),
-                unique_customers=Count('customer_name', distinct=True),
+                total_sales=Sum('gross_sales'),
+                average_order_value=AVERAGE_ORDER_VALUE,
+                total_orders=Sum('receipt_count'),
                 total_items=Sum('quantity'),
-                busiest_day=Max('created_at__date'),
-                slowest_day=Min('created_at__date')
+                busiest_day=Max('date'),
+                slowest_day=Min('date')
             ).order_by('-week')
+            weekly_customers = DailyCustomerRollup.objects.filter(
+                date__range=[start_date, end_date],
+                date__year=current_year
+            ).annotate(
+                week=TruncWeek('date')
+            ).values('week').annotate(
+                unique_customers=Count('customer_name', distinct=True)
+            ).values_list('week', 'unique_customers')
 
             # Historical comparison
-            previous_year_data = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year - 1
+            previous_year_data = DailySalesRollup.objects.filter(
+                date__year=current_year - 1
             ).annotate(
-                week=TruncWeek('created_at')
+                week=TruncWeek('date')
             ).values('week').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity'))
+                total_sales=Sum('gross_sales')
             ).order_by('week')
             response_data = {
                 'current_year': current_year,
-                'weekly_summary': list(weekly_data),
+                'weekly_summary': _merge_counts(weekly_data, 'week', weekly_customers, 'unique_customers'),
                 'previous_year_comparison': list(previous_year_data),
             }
-            cache.set(cache_key, response_data, timeout=3600)
-            return Response(response_data)
-        else:
-            return Response(cached_data)
+            return response_data
+
+        return Response(get_dashboard_payload(cache_key, compute))
     except ValueError as e:
         logger.error(str(e))
         return Response({
@@ -205,39 +239,44 @@ def weekly_analysis(request):
 def monthly_analysis(request):
     """Monthly sales analysis with detailed metrics"""
     try:
-        current_year = timezone.now().year
+        current_year = timezone.localdate().year
         cache_key = f'MONTHLY_{current_year}'
-        monthly_data = cache.get(cache_key)
 
-        if monthly_data is None:
+        def compute():
             # Current year monthly data
-            monthly_data = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
+            monthly_data = DailySalesRollup.objects.filter(
+                date__year=current_year
             ).annotate(
-                month=TruncMonth('created_at')
+                month=TruncMonth('date')
             ).values('month').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
-                total_orders=Count('id'),
-                unique_customers=Count('customer_name', distinct=True),
+                total_sales=Sum('gross_sales'),
+                average_order_value=AVERAGE_ORDER_VALUE,
+                total_orders=Sum('receipt_count'),
                 total_items=Sum('quantity')
             ).order_by('-month')
+            monthly_customers = DailyCustomerRollup.objects.filter(
+                date__year=current_year
+            ).annotate(
+                month=TruncMonth('date')
+            ).values('month').annotate(
+                unique_customers=Count('customer_name', distinct=True)
+            ).values_list('month', 'unique_customers')
 
             # Best-selling products per month (current year)
-            best_selling_products = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
+            best_selling_products = DailyProductRollup.objects.filter(
+                date__year=current_year
             ).annotate(
-                month=TruncMonth('created_at')
+                month=TruncMonth('date')
             ).values('month', 'product_name').annotate(
                 total_quantity=Sum('quantity')
             ).order_by('month', '-total_quantity')
 
             # Historical comparison
-            historical_comparison = RECEIPTS2_FIX.objects.annotate(
-                year=ExtractYear('created_at'),
-                month=TruncMonth('created_at')
+            historical_comparison = DailySalesRollup.objects.annotate(
+                year=ExtractYear('date'),
+                month=TruncMonth('date')
             ).values('year', 'month').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity'))
+                total_sales=Sum('gross_sales')
             ).order_by('year', 'month')
 
             # Process best-selling products
@@ -250,26 +289,20 @@ def monthly_analysis(request):
                         'total_quantity': product['total_quantity']
                     }
 
-            monthly_data_with_products = list(monthly_data)
+            monthly_data_with_products = _merge_counts(
+                monthly_data, 'month', monthly_customers, 'unique_customers'
+            )
             for month_data in monthly_data_with_products:
                 month = month_data['month']
                 month_data['best_selling_product'] = best_products_by_month.get(month, None)
 
-            # Cache the data for 1 hour (3600 seconds)
-            cache.set(cache_key, {
+            return {
                 'current_year': current_year,
                 'current_year_data': monthly_data_with_products,
                 'historical_comparison': list(historical_comparison)
-            }, timeout=3600)
+            }
 
-            return Response({
-                'current_year': current_year,
-                'current_year_data': monthly_data_with_products,
-                'historical_comparison': list(historical_comparison)
-            })
-        else:
-            # Return cached data
-            return Response(monthly_data)
+        return Response(get_dashboard_payload(cache_key, compute))
 
     except Exception as e:
         logger.error(str(e))
@@ -286,53 +319,57 @@ def monthly_analysis(request):
 def yearly_analysis(request):
     """Yearly sales analysis with comparative metrics"""
     try:
-        current_year = timezone.now().year
+        current_year = timezone.localdate().year
         cache_key = f'YEARLY_{current_year}'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
+        def compute():
             # Current year detailed data
-            current_year_data = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
+            current_year_data = DailySalesRollup.objects.filter(
+                date__year=current_year
             ).aggregate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                total_orders=Count('id'),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
-                unique_customers=Count('customer_name', distinct=True),
+                total_sales=Sum('gross_sales'),
+                total_orders=Sum('receipt_count', default=0),
+                average_order_value=AVERAGE_ORDER_VALUE,
                 total_items=Sum('quantity'),
-                highest_sale=Max(F('selling_price') * F('quantity')),
-                average_items_per_order=Avg('quantity')
+                highest_sale=Max('max_sale'),
+                average_items_per_order=Sum('quantity') * 1.0 / Sum('receipt_count')
             )
+            current_year_data['unique_customers'] = DailyCustomerRollup.objects.filter(
+                date__year=current_year
+            ).values('customer_name').distinct().count()
 
             # Historical yearly data
-            yearly_data = RECEIPTS2_FIX.objects.annotate(
-                year=ExtractYear('created_at')
+            yearly_data = DailySalesRollup.objects.annotate(
+                year=ExtractYear('date')
             ).values('year').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                total_orders=Count('id'),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
-                unique_customers=Count('customer_name', distinct=True),
+                total_sales=Sum('gross_sales'),
+                total_orders=Sum('receipt_count'),
+                average_order_value=AVERAGE_ORDER_VALUE,
                 total_items=Sum('quantity')
             ).order_by('-year')
+            yearly_customers = DailyCustomerRollup.objects.annotate(
+                year=ExtractYear('date')
+            ).values('year').annotate(
+                unique_customers=Count('customer_name', distinct=True)
+            ).values_list('year', 'unique_customers')
 
             # Monthly breakdown for year-over-year comparison
-            monthly_breakdown = RECEIPTS2_FIX.objects.annotate(
-                year=ExtractYear('created_at'),
-                month=ExtractMonth('created_at')
+            monthly_breakdown = DailySalesRollup.objects.annotate(
+                year=ExtractYear('date'),
+                month=ExtractMonth('date')
             ).values('year', 'month').annotate(
-                sales=Sum(F('selling_price') * F('quantity')),
-                orders=Count('id'),
+                sales=Sum('gross_sales'),
+                orders=Sum('receipt_count'),
                 items_sold=Sum('quantity')
             ).order_by('year', 'month')
             response_data = {
                 'current_year': current_year,
                 'current_year_summary': current_year_data,
-                'yearly_summary': list(yearly_data),
+                'yearly_summary': _merge_counts(yearly_data, 'year', yearly_customers, 'unique_customers'),
                 'monthly_breakdown': list(monthly_breakdown)
             }
-            cache.set(cache_key, response_data, timeout=3600)
-            return Response(response_data)
-        else:
-            return Response(cached_data)
+            return response_data
+
+        return Response(get_dashboard_payload(cache_key, compute))
     except Exception as e:
         logger.error(str(e))
         return Response({
@@ -346,55 +383,39 @@ def yearly_analysis(request):
 def customer_insights(request):
     """Comprehensive customer analysis"""
     try:
-        current_year = timezone.now().year
+        current_year = timezone.localdate().year
         cache_key = f'CUSTOMER_{current_year}'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
+        def compute():
 
             # Current year top customers
-            current_year_top_customers = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
-            ).values('customer_name').annotate(
-                total_spent=Sum(F('selling_price') * F('quantity')),
-                purchase_count=Count('id'),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
-                first_purchase=Min('created_at'),
-                last_purchase=Max('created_at'),
-                total_items=Sum('quantity')
+            current_year_top_customers = _customer_totals(
+                DailyCustomerRollup.objects.filter(date__year=current_year)
             ).exclude(
                 customer_name='null'
-            ).order_by('-total_spent')[:20]
+            ).order_by('-total_spent')[:TOP_CUSTOMERS]
 
             # All-time top customers
-            all_time_top_customers = RECEIPTS2_FIX.objects.values('customer_name').annotate(
-                total_spent=Sum(F('selling_price') * F('quantity')),
-                purchase_count=Count('id'),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
-                first_purchase=Min('created_at'),
-                last_purchase=Max('created_at'),
-                total_items=Sum('quantity')
-            ).exclude(
-                customer_name='null'
-            ).order_by('-total_spent')[:20]
+            all_time_top_customers = _lcd_customer_totals(LcdCustomers.objects.all())[:TOP_CUSTOMERS]
 
             # Customer purchase frequency analysis
-            frequency_analysis = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
+            purchase_counts = Counter(DailyCustomerRollup.objects.filter(
+                date__year=current_year
             ).values('customer_name').annotate(
-                purchase_count=Count('created_at', distinct=True)
-            ).values('purchase_count').annotate(
-                customer_count=Count('customer_name')
-            ).order_by('purchase_count')
+                purchase_count=Sum('receipt_count')
+            ).values_list('purchase_count', flat=True))
+            frequency_analysis = [
+                {'purchase_count': purchase_count, 'customer_count': customer_count}
+                for purchase_count, customer_count in sorted(purchase_counts.items())
+            ]
             response_data = {
                 'current_year': current_year,
                 'current_year_top_customers': list(current_year_top_customers),
                 'all_time_top_customers': list(all_time_top_customers),
-                'purchase_frequency': list(frequency_analysis),
+                'purchase_frequency': frequency_analysis,
             }
-            cache.set(cache_key, response_data, timeout=3600)
-            return Response(response_data)
-        else:
-            return Response(cached_data)
+            return response_data
+
+        return Response(get_dashboard_payload(cache_key, compute))
     except Exception as e:
         logger.error(str(e))
         return Response({
@@ -409,67 +430,47 @@ def customer_insights(request):
 def product_insights(request):
     """Detailed product performance analysis"""
     try:
-        current_year = timezone.now().year
+        current_year = timezone.localdate().year
         cache_key = f'PRODUCT_INSIGHTS_{current_year}'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
+        def compute():
 
             #Current year product performance
-            current_year_performance = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
-            ).values('product_name').annotate(
-                total_revenue=Sum(F('selling_price') * F('quantity')),
-                units_sold=Sum('quantity'),
-                average_price=Avg('selling_price'),
-                first_sale=Min('created_at'),
-                last_sale=Max('created_at'),
-                unique_customers=Count('customer_name', distinct=True),
-                total_orders=Count('id')
-            ).order_by('-total_revenue')
+            current_year_performance = _summary_performance(
+                SALE_SUMMARY_FIX.objects.filter(period=str(current_year)),
+                ProductCustomerRollup.objects.filter(year=current_year)
+            )
 
             # All-time product performance
-            all_time_performance = RECEIPTS2_FIX.objects.values('product_name').annotate(
-                total_revenue=Sum(F('selling_price') * F('quantity')),
-                units_sold=Sum('quantity'),
-                average_price=Avg('selling_price'),
-                first_sale=Min('created_at'),
-                last_sale=Max('created_at'),
-                unique_customers=Count('customer_name', distinct=True),
-                total_orders=Count('id')
-            ).order_by('-total_revenue')
+            all_time_performance = _summary_performance(
+                SALE_SUMMARY_FIX.objects.filter(period=SALE_SUMMARY_FIX.ALL_TIME),
+                ProductCustomerRollup.objects.all()
+            )
 
             # Monthly trends for current year
-            monthly_trends = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
-            ).annotate(
-                month=TruncMonth('created_at')
-            ).values('month', 'product_name').annotate(
-                revenue=Sum(F('selling_price') * F('quantity')),
-                units_sold=Sum('quantity'),
-                average_price=Avg('selling_price')
-            ).order_by('month', '-revenue')
+            monthly_trends = _product_monthly_trends(
+                DailyProductRollup.objects.filter(date__year=current_year)
+            )
 
             # Product growth comparison (current year vs previous year)
             previous_year = current_year - 1
-            growth_comparison = RECEIPTS2_FIX.objects.filter(
-                created_at__year__in=[current_year, previous_year]
+            growth_comparison = SALE_SUMMARY_FIX.objects.filter(
+                period__in=[str(current_year), str(previous_year)]
             ).annotate(
-                year=ExtractYear('created_at')
+                year=Cast('period', IntegerField())
             ).values('year', 'product_name').annotate(
-                total_revenue=Sum(F('selling_price') * F('quantity')),
-                units_sold=Sum('quantity')
+                total_revenue=F('gross_sales'),
+                units_sold=F('quantity')
             ).order_by('product_name', 'year')
             response_data = {
                 'current_year': current_year,
-                'current_year_performance': list(current_year_performance),
-                'all_time_performance': list(all_time_performance),
+                'current_year_performance': current_year_performance,
+                'all_time_performance': all_time_performance,
                 'monthly_trends': list(monthly_trends),
                 'growth_comparison': list(growth_comparison)
             }
-            cache.set(cache_key, response_data, timeout=3600)
-            return Response(response_data)
-        else:
-            return Response(cached_data)
+            return response_data
+
+        return Response(get_dashboard_payload(cache_key, compute))
     except Exception as e:
         logger.error(str(e))
         return Response({
@@ -485,54 +486,50 @@ def product_insights(request):
 def sales_patterns(request):
     """Analysis of sales patterns and trends"""
     try:
-        current_year = timezone.now().year
+        current_year = timezone.localdate().year
         cache_key = f'SALES_PATTERNS_{current_year}'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
+        def compute():
             # Daily patterns for current year
-            daily_patterns = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
+            daily_patterns = DailySalesRollup.objects.filter(
+                date__year=current_year
             ).annotate(
-                day=ExtractDay('created_at')
+                day=ExtractDay('date')
             ).values('day').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                order_count=Count('id'),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
+                total_sales=Sum('gross_sales'),
+                order_count=Sum('receipt_count'),
+                average_order_value=AVERAGE_ORDER_VALUE,
                 items_sold=Sum('quantity')
             ).order_by('day')
 
             # Hour of day analysis for current year
-            hourly_patterns = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
-            ).annotate(
-                hour=ExtractHour('created_at')
+            hourly_patterns = HourlySalesRollup.objects.filter(
+                date__year=current_year
             ).values('hour').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                order_count=Count('id'),
-                average_order_value=Avg(F('selling_price') * F('quantity'))
+                total_sales=Sum('gross_sales'),
+                order_count=Sum('receipt_count'),
+                average_order_value=AVERAGE_ORDER_VALUE
             ).order_by('hour')
 
             # Day of week analysis
-            day_of_week_patterns = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
+            day_of_week_patterns = DailySalesRollup.objects.filter(
+                date__year=current_year
             ).annotate(
-                day_of_week=ExtractDay('created_at')
+                day_of_week=ExtractDay('date')
             ).values('day_of_week').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                order_count=Count('id'),
-                average_order_value=Avg(F('selling_price') * F('quantity')),
+                total_sales=Sum('gross_sales'),
+                order_count=Sum('receipt_count'),
+                average_order_value=AVERAGE_ORDER_VALUE,
                 items_sold=Sum('quantity')
             ).order_by('day_of_week')
 
             # Peak sales periods
-            peak_sales = RECEIPTS2_FIX.objects.filter(
-                created_at__year=current_year
+            peak_sales = HourlySalesRollup.objects.filter(
+                date__year=current_year
             ).annotate(
-                hour=ExtractHour('created_at'),
-                day_of_week=ExtractDay('created_at')
+                day_of_week=ExtractDay('date')
             ).values('hour', 'day_of_week').annotate(
-                total_sales=Sum(F('selling_price') * F('quantity')),
-                order_count=Count('id')
+                total_sales=Sum('gross_sales'),
+                order_count=Sum('receipt_count')
             ).order_by('-total_sales')[:10]
             response_data = {
                 'current_year': current_year,
@@ -541,9 +538,9 @@ def sales_patterns(request):
                 'day_of_week_patterns': list(day_of_week_patterns),
                 'peak_sales_periods': list(peak_sales)
             }
-            return Response(response_data)
-        else:
-            return Response(cached_data)
+            return response_data
+
+        return Response(get_dashboard_payload(cache_key, compute))
     except Exception as e:
         logger.error(str(e))
         return Response({
@@ -551,10 +548,45 @@ def sales_patterns(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+# Recent movements returned alongside the summary
+STOCK_MOVEMENT_HISTORY_LIMIT = 100
+
+
+@api_view(['GET'])
+@authentication_classes([ClerkAuthentication])
+@throttle_classes([DashBoardThrottle])
+@permission_classes([IsAuthenticated])
+@handle_database_errors
+def stock_movements(request, product_id):
+    """Movement history and sell-through for one product over the last `days` days (default 30)"""
+    try:
+        days = int(request.query_params.get('days', 30))
+    except ValueError:
+        return Response({'error': 'days must be a whole number'}, status=status.HTTP_400_BAD_REQUEST)
+    if days < 1:
+        return Response({'error': 'days must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        since = timezone.now() - timedelta(days=days)
+        history = movement_history(product_id, since).values(
+            'id', 'kind', 'quantity_change', 'quantity_after', 'created_at'
+        )[:STOCK_MOVEMENT_HISTORY_LIMIT]
+        return Response({
+            'product_id': product_id,
+            'days': days,
+            'summary': movement_summary(product_id, since),
+            'movements': list(history),
+        })
+    except Exception as e:
+        logger.error(str(e))
+        return Response({
+            'error': 'Failed to fetch stock movements',
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # Cache invalidation function
 def invalidate_dashboard_caches():
     """Invalidate all dashboard-related caches"""
-    today = timezone.now().date()
+    today = timezone.localdate()
     cache_keys = [
         f'DASHBOARD_{today.year}',
         f'WEEKLY_ANALYSIS_{today.year}',
@@ -565,4 +597,265 @@ def invalidate_dashboard_caches():
         f'SALES_PATTERNS_{today.year}',
 
     ]
-    cache.delete_many(cache_keys)
\ No newline at end of file
+    # Readers keep getting the old payloads while a single worker recomputes them
+    mark_stale(*cache_keys)
+
+class _SaleDelta:
+    """Contribution of a batch of receipts completed today to the dashboard windows"""
+
+    def __init__(self, receipts, today):
+        self.today = today
+        self.year_start = today.replace(month=1, day=1)
+        self.month_start = today.replace(day=1)
+        self.week_start = dashboard_windows(today)['current_week'][0]
+        amounts = [receipt.selling_price * receipt.quantity for receipt in receipts]
+        self.count = len(receipts)
+        self.revenue = sum(amounts)
+        self.items = sum(receipt.quantity for receipt in receipts)
+        self.highest_sale = max(amounts)
+        self.customer_counts = Counter(receipt.customer_name for receipt in receipts)
+        self.product_names = {receipt.product_name for receipt in receipts}
+        self._first_today = None
+
+    def new_customers(self, since):
+        """
+        Number of customers in this batch with no earlier purchase on or after
+        `since`, or with no earlier purchase at all when `since` is None.
+        """
+        if self._first_today is None:
+            rows = DailyCustomerRollup.objects.filter(
+                customer_name__in=self.customer_counts,
+                date__lte=self.today
+            ).values('customer_name').annotate(
+                previous_purchase=Max('date', filter=Q(date__lt=self.today)),
+                purchases_today=Sum('receipt_count', filter=Q(date=self.today))
+            )
+            # Customers whose only purchases today are the ones in this batch
+            self._first_today = {
+                row['customer_name']: row['previous_purchase'] for row in rows
+                if row['purchases_today'] == self.customer_counts[row['customer_name']]
+            }
+        return sum(
+            1 for previous in self._first_today.values()
+            if previous is None or (since is not None and previous < since)
+        )
+
+
+def _add_sale(row, sale, sales='total_sales', orders='total_orders', items='total_items'):
+    row[sales] = (row[sales] or 0) + sale.revenue
+    row[orders] = (row[orders] or 0) + sale.count
+    row[items] = (row[items] or 0) + sale.items
+    if 'average_order_value' in row:
+        row['average_order_value'] = row[sales] / row[orders]
+
+
+def _find_or_insert(rows, match, default, at_start):
+    for row in rows:
+        if all(row[key] == value for key, value in match.items()):
+            return row
+    row = {**match, **default}
+    if at_start:
+        rows.insert(0, row)
+    else:
+        rows.append(row)
+    return row
+
+
+def _replace_rows(rows, fresh_rows, key, sort_key, limit=None):
+    """Swap in recomputed rows, keep the list ordered and trimmed like the original query"""
+    fresh_keys = {key(row) for row in fresh_rows}
+    rows = [row for row in rows if key(row) not in fresh_keys] + list(fresh_rows)
+    rows.sort(key=sort_key)
+    return rows[:limit] if limit else rows
+
+
+def _patch_main_dashboard(payload, sale):
+    today_metrics = payload['today_metrics']
+    today_metrics['sales_count'] += sale.count
+    today_metrics['total_sales'] += sale.revenue
+    today_metrics['total_items_sold'] += sale.items
+    today_metrics['unique_customers'] += sale.new_customers(sale.today)
+    payload['current_week_sales'] += sale.revenue
+
+    all_time_totals = payload['all_time_totals']
+    all_time_totals['total_sales'] = (all_time_totals['total_sales'] or 0) + sale.revenue
+    all_time_totals['total_orders'] += sale.count
+    all_time_totals['total_customers'] += sale.new_customers(None)
+
+
+def _patch_weekly_analysis(payload, sale):
+    week = _find_or_insert(payload['weekly_summary'], {
+        'week': sale.today - timedelta(days=sale.today.weekday())
+    }, {
+        'total_sales': 0, 'average_order_value': None, 'total_orders': 0, 'total_items': 0,
+        'busiest_day': sale.today, 'slowest_day': sale.today, 'unique_customers': 0,
+    }, at_start=True)
+    _add_sale(week, sale)
+    week['busiest_day'] = max(week['busiest_day'], sale.today)
+    week['unique_customers'] += sale.new_customers(sale.week_start)
+
+
+def _patch_monthly_analysis(payload, sale):
+    month = _find_or_insert(payload['current_year_data'], {'month': sale.month_start}, {
+        'total_sales': 0, 'average_order_value': None, 'total_orders': 0, 'total_items': 0,
+        'unique_customers': 0, 'best_selling_product': None,
+    }, at_start=True)
+    _add_sale(month, sale)
+    month['unique_customers'] += sale.new_customers(sale.month_start)
+
+    product_quantities = DailyProductRollup.objects.filter(
+        product_name__in=sale.product_names,
+        date__range=[sale.month_start, sale.today]
+    ).values('product_name').annotate(
+        total_quantity=Sum('quantity')
+    )
+    for product in product_quantities:
+        best = month['best_selling_product']
+        if best is None or product['total_quantity'] > best['total_quantity']:
+            month['best_selling_product'] = product
+
+    history = _find_or_insert(payload['historical_comparison'], {
+        'year': sale.today.year, 'month': sale.month_start
+    }, {'total_sales': 0}, at_start=False)
+    history['total_sales'] += sale.revenue
+
+
+def _patch_yearly_analysis(payload, sale):
+    summary = payload['current_year_summary']
+    _add_sale(summary, sale)
+    summary['highest_sale'] = max(summary['highest_sale'] or 0, sale.highest_sale)
+    summary['average_items_per_order'] = summary['total_items'] / summary['total_orders']
+    summary['unique_customers'] += sale.new_customers(sale.year_start)
+
+    year = _find_or_insert(payload['yearly_summary'], {'year': sale.today.year}, {
+        'total_sales': 0, 'total_orders': 0, 'average_order_value': None, 'total_items': 0,
+        'unique_customers': 0,
+    }, at_start=True)
+    _add_sale(year, sale)
+    year['unique_customers'] += sale.new_customers(sale.year_start)
+
+    month = _find_or_insert(payload['monthly_breakdown'], {
+        'year': sale.today.year, 'month': sale.today.month
+    }, {'sales': 0, 'orders': 0, 'items_sold': 0}, at_start=False)
+    _add_sale(month, sale, sales='sales', orders='orders', items='items_sold')
+
+
+def _patch_customer_insights(payload, sale):
+    names = list(sale.customer_counts)
+    current_year = _customer_totals(
+        DailyCustomerRollup.objects.filter(date__year=sale.today.year, customer_name__in=names)
+    )
+    current_year = {row['customer_name']: row for row in current_year}
+    all_time = _lcd_customer_totals(LcdCustomers.objects.filter(customer_name__in=names))
+
+    by_spend = lambda row: -row['total_spent']
+    by_name = lambda row: row['customer_name']
+    payload['current_year_top_customers'] = _replace_rows(
+        payload['current_year_top_customers'],
+        [row for name, row in current_year.items() if name != 'null'],
+        by_name, by_spend, TOP_CUSTOMERS
+    )
+    payload['all_time_top_customers'] = _replace_rows(
+        payload['all_time_top_customers'], list(all_time), by_name, by_spend, TOP_CUSTOMERS
+    )
+
+    # Move each customer from their old purchase-count bucket to the new one
+    frequency = Counter({
+        row['purchase_count']: row['customer_count'] for row in payload['purchase_frequency']
+    })
+    for name, count in sale.customer_counts.items():
+        purchases = current_year[name]['purchase_count']
+        if purchases > count:
+            frequency[purchases - count] -= 1
+        frequency[purchases] += 1
+    payload['purchase_frequency'] = [
+        {'purchase_count': purchase_count, 'customer_count': customer_count}
+        for purchase_count, customer_count in sorted(frequency.items()) if customer_count > 0
+    ]
+
+
+def _patch_product_insights(payload, sale):
+    names = sale.product_names
+    current_year = sale.today.year
+    by_name = lambda row: row['product_name']
+    by_revenue = lambda row: -row['total_revenue']
+
+    current_year_rows = _summary_performance(
+        SALE_SUMMARY_FIX.objects.filter(period=str(current_year), product_name__in=names),
+        ProductCustomerRollup.objects.filter(year=current_year, product_name__in=names)
+    )
+    payload['current_year_performance'] = _replace_rows(
+        payload['current_year_performance'], current_year_rows, by_name, by_revenue
+    )
+    payload['all_time_performance'] = _replace_rows(
+        payload['all_time_performance'],
+        _summary_performance(
+            SALE_SUMMARY_FIX.objects.filter(period=SALE_SUMMARY_FIX.ALL_TIME, product_name__in=names),
+            ProductCustomerRollup.objects.filter(product_name__in=names)
+        ),
+        by_name, by_revenue
+    )
+    payload['monthly_trends'] = _replace_rows(
+        payload['monthly_trends'],
+        list(_product_monthly_trends(
+            DailyProductRollup.objects.filter(product_name__in=names, date__range=[sale.month_start, sale.today])
+        )),
+        lambda row: (row['month'], row['product_name']),
+        lambda row: (row['month'], -row['revenue'])
+    )
+    payload['growth_comparison'] = _replace_rows(
+        payload['growth_comparison'],
+        [{'year': current_year, 'product_name': row['product_name'], 'total_revenue': row['total_revenue'],
+          'units_sold': row['units_sold']} for row in current_year_rows],
+        lambda row: (row['year'], row['product_name']),
+        lambda row: (row['product_name'], row['year'])
+    )
+
+
+def _dashboard_cache_lock():
+    """Serialise payload patching across workers when the cache backend supports locks"""
+    lock = getattr(cache, 'lock', None)
+    return lock('DASHBOARD_PATCH_LOCK', timeout=10, blocking_timeout=5) if lock else nullcontext()
+
+
+def apply_sales_to_dashboard_caches(receipts):
+    """
+    Patch the cached dashboard payloads with newly completed receipts instead of
+    invalidating them. Stale payloads are left for the next request to recompute
+    from the rollups.
+    Call after the transaction that wrote the receipts and their rollups commits.
+    """
+    if not receipts:
+        return
+    today = timezone.localdate()
+    if any(timezone.localtime(receipt.created_at).date() != today for receipt in receipts):
+        invalidate_dashboard_caches()
+        return
+
+    patchers = {
+        f'DASHBOARD_{today.year}': _patch_main_dashboard,
+        f'WEEKLY_ANALYSIS_{today.year}': _patch_weekly_analysis,
+        f'MONTHLY_{today.year}': _patch_monthly_analysis,
+        f'YEARLY_{today.year}': _patch_yearly_analysis,
+        f'CUSTOMER_{today.year}': _patch_customer_insights,
+        f'PRODUCT_INSIGHTS_{today.year}': _patch_product_insights,
+    }
+    try:
+        with _dashboard_cache_lock():
+            cached = cache.get_many([key for cache_key in patchers for key in freshness_keys(cache_key)])
+            sale = _SaleDelta(receipts, today)
+            patched = {}
+            for cache_key, patch in patchers.items():
+                # Stale payloads are left alone, the next reader recomputes them
+                if not is_fresh(cached, cache_key, today):
+                    continue
+                payload = cached[cache_key]
+                patch(payload, sale)
+                patched[cache_key] = payload
+            # Sales patterns are not patched, have them recomputed
+            mark_stale(f'SALES_PATTERNS_{today.year}')
+            if patched:
+                cache.set_many(patched, timeout=DASHBOARD_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Failed to patch dashboard caches: {e}")
+        invalidate_dashboard_caches()
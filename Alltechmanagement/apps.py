@@ -1,6 +1,33 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core import checks
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_migrate
+
+
+def create_postgres_extensions(using, **kwargs):
+    """The trigram indexes need pg_trgm, which no generated migration creates"""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
 
 
 class AlltechmanagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Alltechmanagement'
+
+    def ready(self):
+        pre_migrate.connect(create_postgres_extensions, sender=self)
+
+        from Alltechmanagement.clerk_auth_class import check_clerk_settings
+        checks.register(check_clerk_settings, checks.Tags.security, deploy=True)
+
+        from Alltechmanagement.firebase_auth import invalidate_authorized_uids
+        from Alltechmanagement.models import AuthorizedFirebaseToken
+        post_save.connect(invalidate_authorized_uids, sender=AuthorizedFirebaseToken)
+        post_delete.connect(invalidate_authorized_uids, sender=AuthorizedFirebaseToken)
+
+        if getattr(settings, 'FIREBASE_AUTH_PREWARM', False):
+            from Alltechmanagement.firebase_auth import prewarm_firebase_auth
+            prewarm_firebase_auth()
@@ -0,0 +1,104 @@
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+logger = logging.getLogger('django')
+
+# How long a worker may hold the recompute lock before another one takes over
+RECOMPUTE_LOCK_TIMEOUT = 30
+# How long a request without any cached copy waits for the worker that is recomputing
+RECOMPUTE_WAIT_SECONDS = 5
+RECOMPUTE_POLL_INTERVAL = 0.05
+
+
+def _fresh_key(key):
+    return f'{key}_FRESH'
+
+
+def _lock_key(key):
+    return f'{key}_LOCK'
+
+
+def _version_key(namespace):
+    return f'{namespace}_VERSION'
+
+
+def store(key, payload, fresh_for, keep_for, token=True):
+    """
+    Cache `payload` under `key`. It is served as fresh for `fresh_for` seconds (and
+    only while the freshness marker still equals `token`), and kept as a stale
+    fallback for `keep_for` seconds in total.
+    """
+    cache.set(key, payload, timeout=keep_for)
+    cache.set(_fresh_key(key), token, timeout=fresh_for)
+
+
+def is_fresh(cached, key, token=True):
+    """Whether a `get_many` result covering `freshness_keys(key)` holds a fresh payload"""
+    return cached.get(key) is not None and cached.get(_fresh_key(key)) == token
+
+
+def freshness_keys(key):
+    return [key, _fresh_key(key)]
+
+
+def mark_stale(*keys):
+    """Invalidate payloads while keeping them around to serve during the recompute"""
+    cache.delete_many([_fresh_key(key) for key in keys])
+
+
+def get_or_compute(key, compute, fresh_for, keep_for, token=True):
+    """
+    Compute-once cache read. When the cached payload is missing or stale only one
+    worker (the one that wins the lock) runs `compute`; the others serve the stale
+    payload, or wait for the winner when there is nothing cached yet.
+    """
+    cached = cache.get_many(freshness_keys(key))
+    payload = cached.get(key)
+    if is_fresh(cached, key, token):
+        return payload
+
+    if cache.add(_lock_key(key), True, timeout=RECOMPUTE_LOCK_TIMEOUT):
+        try:
+            payload = compute()
+            store(key, payload, fresh_for, keep_for, token)
+            return payload
+        finally:
+            cache.delete(_lock_key(key))
+
+    if payload is not None:
+        return payload
+
+    deadline = time.monotonic() + RECOMPUTE_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(RECOMPUTE_POLL_INTERVAL)
+        payload = cache.get(key)
+        if payload is not None:
+            return payload
+
+    logger.warning(f"Timed out waiting for {key} to be recomputed, computing it here")
+    return compute()
+
+
+def get_version(namespace):
+    """Current version of a family of cache keys, used to build keys that never need deleting"""
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # Seed from the clock so a version lost to eviction never repeats an older one
+        cache.add(_version_key(namespace), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every key built from the namespace version; old entries simply expire"""
+    try:
+        return cache.incr(_version_key(namespace))
+    except ValueError:
+        return get_version(namespace)
+
+
+async def abump_version(namespace):
+    return await sync_to_async(bump_version)(namespace)
@@ -1,10 +1,11 @@
 import logging
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authentication import BaseAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import Token
 
+from Alltechmanagement.custom_auth import token_validator, get_validated_token
+
 logger = logging.getLogger('django.security')
 
 
@@ -21,20 +22,19 @@ class CeleryUser:
 class CeleryJWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
         logger.debug("CeleryJWTAuthentication: authenticate called")
-        jwt_auth = JWTAuthentication()
 
         try:
-            header = jwt_auth.get_header(request)
+            header = token_validator.get_header(request)
             if header is None:
                 logger.debug("CeleryJWTAuthentication: No JWT header found")
                 return None
 
-            raw_token = jwt_auth.get_raw_token(header)
+            raw_token = token_validator.get_raw_token(header)
             if raw_token is None:
                 logger.debug("CeleryJWTAuthentication: No raw token found")
                 return None
 
-            validated_token = jwt_auth.get_validated_token(raw_token)
+            validated_token = get_validated_token(raw_token)
             logger.debug(f"CeleryJWTAuthentication: Token validated successfully")
 
             if not validated_token.get('is_celery', False):
@@ -51,4 +51,4 @@ class CeleryJWTAuthentication(BaseAuthentication):
 
     def authenticate_header(self, request):
         logger.debug("CeleryJWTAuthentication: authenticate_header called")
-        return JWTAuthentication().authenticate_header(request)
+        return token_validator.authenticate_header(request)
@@ -1,14 +1,111 @@
 import logging
 import os
+import threading
+
+from cachetools import TTLCache
+from django.core.checks import Error
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from clerk_backend_api import Clerk
 logger = logging.getLogger('django')
 import jwt
-from jwt.exceptions import InvalidTokenError
+from jwt.exceptions import PyJWTError
 from dotenv import load_dotenv
 load_dotenv()
 
+# Clerk signs session tokens with RS256; the key set is fetched from CLERK_JWKS_URL (by
+# default derived from CLERK_ISSUER) and refetched when it expires or a token names a
+# key id that is not in it yet
+JWKS_CACHE_SECONDS = 3600
+# Session tokens are short lived, so allow a little clock skew between Clerk and us
+CLOCK_SKEW_SECONDS = 5
+# Resolved Clerk users, keyed by the token's `sub`
+USER_CACHE_SIZE = 256
+USER_CACHE_SECONDS = 300
+
+_clients_lock = threading.Lock()
+_clerk_client = None
+_jwks_client = None
+_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_SECONDS)
+_users_lock = threading.Lock()
+
+
+def get_clerk_client():
+    """One Clerk API client per process"""
+    global _clerk_client
+    if _clerk_client is None:
+        with _clients_lock:
+            if _clerk_client is None:
+                _clerk_client = Clerk(bearer_auth=os.getenv('CLERK_SECRET_KEY'))
+    return _clerk_client
+
+
+def jwks_url():
+    url = os.getenv('CLERK_JWKS_URL')
+    if url:
+        return url
+    issuer = os.getenv('CLERK_ISSUER')
+    if issuer:
+        return f"{issuer.rstrip('/')}/.well-known/jwks.json"
+    raise ImproperlyConfigured('Set CLERK_ISSUER or CLERK_JWKS_URL to verify Clerk session tokens')
+
+
+def check_clerk_settings(app_configs, **kwargs):
+    """Deploy check (manage.py check --deploy) for the Clerk token verification settings"""
+    try:
+        jwks_url()
+    except ImproperlyConfigured as e:
+        return [Error(str(e), id='Alltechmanagement.E001')]
+    return []
+
+
+def get_jwks_client():
+    global _jwks_client
+    if _jwks_client is None:
+        with _clients_lock:
+            if _jwks_client is None:
+                _jwks_client = jwt.PyJWKClient(jwks_url(), cache_keys=True, lifespan=JWKS_CACHE_SECONDS)
+    return _jwks_client
+
+
+def verify_session_token(token):
+    """
+    Verify a Clerk session token locally against the cached JWKS and return its claims.
+    CLERK_ISSUER and CLERK_AUTHORIZED_PARTIES (comma separated) are checked when set.
+    """
+    signing_key = get_jwks_client().get_signing_key_from_jwt(token)
+    claims = jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=['RS256'],
+        issuer=os.getenv('CLERK_ISSUER') or None,
+        leeway=CLOCK_SKEW_SECONDS,
+        options={'require': ['exp', 'iat', 'sub']},
+    )
+    authorized_parties = [party for party in os.getenv('CLERK_AUTHORIZED_PARTIES', '').split(',') if party]
+    if authorized_parties and claims.get('azp') not in authorized_parties:
+        raise jwt.InvalidTokenError('Token issued for an unauthorized party')
+    return claims
+
+
+def get_clerk_user(user_id):
+    """The Clerk user for `user_id`, from the TTL cache or, on a miss, the Clerk API"""
+    with _users_lock:
+        user = _users.get(user_id)
+    if user is None:
+        user = get_clerk_client().users.get(user_id=user_id)
+        if user:
+            with _users_lock:
+                _users[user_id] = user
+    return user
+
+
+def forget_clerk_user(user_id):
+    """Drop a cached user, e.g. after they are banned or removed in Clerk"""
+    with _users_lock:
+        _users.pop(user_id, None)
+
 
 class ClerkUser:
     def __init__(self, data,is_authenticated=False,is_active=False):
@@ -20,9 +117,6 @@ class ClerkUser:
         return str(self.data)
 
 class ClerkAuthentication(BaseAuthentication):
-    def __init__(self):
-        self.clerk = Clerk(bearer_auth=os.getenv('CLERK_SECRET_KEY'))
-
     def authenticate(self, request):
         auth_header = request.headers.get('Authorization')
         request_ip = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -34,31 +128,29 @@ class ClerkAuthentication(BaseAuthentication):
             raise AuthenticationFailed('No valid authorization token provided')
 
         token = auth_header.split(' ')[1]
+        # Only token and Clerk API failures are authentication failures; configuration
+        # errors propagate so they surface as server errors instead of 401s
+        try:
+            # Verify the signature and expiry locally, no network call once the key set is cached
+            decoded_token = verify_session_token(token)
+        except PyJWTError as token_error:
+            logger.warning(f"Auth failed from IP {request_ip}: {str(token_error)}")
+            raise AuthenticationFailed('Invalid JWT token')
+
+        # Get the user ID from the token
+        user_id = decoded_token.get('sub')
+        if not user_id:
+            raise AuthenticationFailed('No user ID in token')
+
+        # Get user data from Clerk, cached per user
         try:
-            # First decode the token to verify it's valid JWT
-            try:
-                decoded_token = jwt.decode(token, options={"verify_signature": False})
-            except InvalidTokenError:
-                raise AuthenticationFailed('Invalid JWT token format')
-
-            # Get the user ID from the token
-            user_id = decoded_token.get('sub')
-            if not user_id:
-                raise AuthenticationFailed('No user ID in token')
-
-            # Get user data from Clerk
-            try:
-                user = self.clerk.users.get(user_id=user_id)
-                if not user:
-                    raise AuthenticationFailed('User not found')
-                return ClerkUser(user,is_authenticated=True,is_active=True), token
-            except Exception as clerk_error:
-                logger.error(str(clerk_error))
-                raise AuthenticationFailed(f'Clerk API error')
-
-        except Exception as e:
-            logger.error(f"Auth failed from IP {request_ip}: {str(e)}")
-            raise AuthenticationFailed(f'Authentication failed')
+            user = get_clerk_user(user_id)
+        except Exception as clerk_error:
+            logger.error(f"Auth failed from IP {request_ip}: Clerk API error {str(clerk_error)}")
+            raise AuthenticationFailed('Clerk API error')
+        if not user:
+            raise AuthenticationFailed('User not found')
+        return ClerkUser(user,is_authenticated=True,is_active=True), token
 
     def authenticate_header(self, request):
-        return 'Bearer'
\ No newline at end of file
+        return 'Bearer'
@@ -1,11 +1,228 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 12  # Number of items per page
 
+    def page_cache_key(self, queryset, request):
+        """
+        The page number `request` asks for, normalized for use in a cache key. A number that
+        is not a positive integer is a NotFound here, like in paginate_queryset; one past the
+        last page fails when the page is computed, so it is never cached either.
+        """
+        page_number = request.query_params.get(self.page_query_param) or 1
+        paginator = self.django_paginator_class(queryset, self.get_page_size(request))
+        if page_number in self.last_page_strings:
+            return paginator.num_pages
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            message = paginator.error_messages['invalid_page']
+        else:
+            if page_number >= 1:
+                return page_number
+            message = paginator.error_messages['min_page']
+        raise NotFound(self.invalid_page_message.format(page_number=page_number, message=message))
+
+    def serialize_page(self, queryset, request, serializer_class):
+        """Paginate and serialize `queryset` into a plain dict that can be cached as is"""
+        page = self.paginate_queryset(queryset, request)
+        return {
+            'count': self.page.paginator.count,
+            'number': self.page.number,
+            'num_pages': self.page.paginator.num_pages,
+            'results': [dict(row) for row in serializer_class(page, many=True).data],
+        }
+
+    def get_cached_page_response(self, request, cached_page):
+        """The same response as get_paginated_response, built from a serialize_page dict"""
+        url = request.build_absolute_uri()
+        number = cached_page['number']
+        next_link = None
+        if number < cached_page['num_pages']:
+            next_link = replace_query_param(url, self.page_query_param, number + 1)
+        previous_link = None
+        if number > 1:
+            previous_link = remove_query_param(url, self.page_query_param) if number == 2 \
+                else replace_query_param(url, self.page_query_param, number - 1)
+        return Response({
+            'count': cached_page['count'],
+            'next': next_link,
+            'previous': previous_link,
+            'results': cached_page['results'],
+        })
+
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 100
     page_size_query_param = 'page_size'
     max_page_size = 1000
+
+
+def wants_cursor_pagination(request):
+    """Clients opt into keyset pagination with ?pagination=cursor (or by following a cursor link)"""
+    return (request.query_params.get('pagination') == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks straight to the row after the cursor with a WHERE on
+    the ordering columns, so there is no COUNT and no OFFSET however deep the client
+    pages. The last ordering field must be unique so every row has its own position.
+    """
+    ordering = ('id',)
+    page_size = 12
+    page_size_query_param = None
+    max_page_size = None
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size) if self.max_page_size else size
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': reverse})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def decode_cursor(self, encoded, model):
+        """
+        The (position, reverse) a cursor stands for, each position value converted by its
+        ordering field so a tampered cursor is a 404 rather than a database error
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = payload['p'], payload['r']
+            if not isinstance(position, list) or len(position) != len(self.ordering) \
+                    or not isinstance(reverse, bool):
+                raise ValueError(encoded)
+            position = [model._meta.get_field(field.lstrip('-')).to_python(value)
+                        for field, value in zip(self.ordering, position)]
+            if None in position:
+                raise ValueError(encoded)
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def page_cache_key(self, queryset, request):
+        """
+        The page `request` asks for, normalized for use in a cache key: the decoded cursor
+        position rather than its encoding. Raises NotFound for a cursor that does not decode.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        position, reverse = self.decode_cursor(encoded, queryset.model) if encoded else (None, False)
+        if position is not None:
+            position = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in position]
+        return f"CURSOR_{self.get_page_size(request)}_{json.dumps([position, reverse], separators=(',', ':'))}"
+
+    def _seek(self, position, reverse):
+        """Rows strictly after `position` in the (possibly reversed) ordering"""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[i]})
+            for previous, value in zip(self.ordering[:i], position):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def _position(self, row):
+        position = []
+        for field in self.ordering:
+            value = getattr(row, field.lstrip('-'))
+            # Keep full microsecond precision, rows stamped in the same millisecond must not be skipped
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        encoded = request.query_params.get(self.cursor_query_param)
+        position, reverse = self.decode_cursor(encoded, queryset.model) if encoded else (None, False)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [field.lstrip('-') if field.startswith('-') else f'-{field}' for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(position, reverse))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # Coming from a cursor means there are rows on the side we came from
+        has_next, has_previous = (position is not None, has_more) if reverse else (has_more, position is not None)
+        self.next_cursor = self.encode_cursor(self._position(rows[-1]), False) if rows and has_next else None
+        self.previous_cursor = self.encode_cursor(self._position(rows[0]), True) if rows and has_previous else None
+        return rows
+
+    def _link(self, request, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self._link(self.request, self.next_cursor),
+            'previous': self._link(self.request, self.previous_cursor),
+            'results': data,
+        })
+
+    def serialize_page(self, queryset, request, serializer_class):
+        """Paginate and serialize `queryset` into a plain dict that can be cached as is"""
+        page = self.paginate_queryset(queryset, request)
+        return {
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+            'results': [dict(row) for row in serializer_class(page, many=True).data],
+        }
+
+    def get_cached_page_response(self, request, cached_page):
+        """The same response as get_paginated_response, built from a serialize_page dict"""
+        return Response({
+            'next': self._link(request, cached_page['next_cursor']),
+            'previous': self._link(request, cached_page['previous_cursor']),
+            'results': cached_page['results'],
+        })
+
+
+class StockCursorPagination(KeysetPagination):
+    ordering = ('id',)
+    page_size = 12
+
+
+class LowStockCursorPagination(KeysetPagination):
+    ordering = ('quantity', 'id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class SavedTransactionsCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -1,12 +1,42 @@
-from datetime import datetime, timezone
+import hashlib
+import threading
+import time
+
+from cachetools import TLRUCache
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken
-from rest_framework.exceptions import AuthenticationFailed
-from django.utils import timezone as django_timezone
 import logging
 
 logger = logging.getLogger('django')
 
+# Verified access tokens kept per process. An entry never outlives the token's own `exp`
+VERIFIED_TOKEN_CACHE_SIZE = 1024
+
+# Built once: header parsing and signature checks need no per-request state
+token_validator = JWTAuthentication()
+_verified_tokens = TLRUCache(
+    maxsize=VERIFIED_TOKEN_CACHE_SIZE, ttu=lambda key, token, now: token['exp'], timer=time.time
+)
+_verified_tokens_lock = threading.Lock()
+
+
+def get_validated_token(raw_token):
+    """
+    simplejwt validation with a small LRU of already verified tokens in front of it,
+    keyed by the token's SHA-256 so raw tokens are never held in memory.
+    """
+    key = hashlib.sha256(raw_token if isinstance(raw_token, bytes) else raw_token.encode()).digest()
+    with _verified_tokens_lock:
+        validated_token = _verified_tokens.get(key)
+    if validated_token is not None:
+        return validated_token
+
+    validated_token = token_validator.get_validated_token(raw_token)
+    if validated_token.get('exp') is not None:
+        with _verified_tokens_lock:
+            _verified_tokens[key] = validated_token
+    return validated_token
+
 
 class CustomUser:
     def __init__(self, firebase_uid, is_authenticated=False):
@@ -36,21 +66,12 @@ class CustomJWTAuthentication(JWTAuthentication):
     Custom JWT Authentication that retrieves the user from the validated token.
     """
 
+    def get_validated_token(self, raw_token):
+        return get_validated_token(raw_token)
+
     def get_user(self, validated_token):
-        try:
-            firebase_uid = validated_token.get('firebase_uid')
-            if not firebase_uid:
-                raise InvalidToken('Token contains no valid firebase_uid')
-
-            # Check if the token has expired
-            exp = validated_token.get('exp')
-            if exp is not None:
-                exp_datetime = datetime.fromtimestamp(exp, tz=timezone.utc)
-                if django_timezone.now() > exp_datetime:
-                    raise InvalidToken('Token has expired')
-
-            return CustomUser(firebase_uid=firebase_uid,is_authenticated=True)
-
-        except Exception as e:
-            logger.error(f"Error getting user from token: {str(e)}")
-            raise AuthenticationFailed('Authentication failed due to an internal error.')
+        # Signature and expiry were already checked by simplejwt
+        firebase_uid = validated_token.get('firebase_uid')
+        if not firebase_uid:
+            raise InvalidToken('Token contains no valid firebase_uid')
+        return CustomUser(firebase_uid=firebase_uid,is_authenticated=True)
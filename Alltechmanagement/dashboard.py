@@ -0,0 +1,99 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from Alltechmanagement.models import RECEIPTS2_FIX, DailySalesRollup, DailyCustomerRollup
+
+
+def dashboard_windows(today):
+    """
+    Half-open [start, end) date windows shown on the main dashboard.
+    Like the dashboard always has, windows are clipped to the current year.
+    """
+    year_start = today.replace(month=1, day=1)
+    tomorrow = today + timedelta(days=1)
+    week_start = max(today - timedelta(days=today.weekday()), year_start)
+    last_week_start = max(today - timedelta(days=today.weekday() + 7), year_start)
+    return {
+        'today': (today, tomorrow),
+        'yesterday': (max(today - timedelta(days=1), year_start), today),
+        'current_week': (week_start, tomorrow),
+        'last_week': (last_week_start, week_start),
+    }
+
+
+def _window_filters(field, today, to_bound=lambda day: day):
+    return {
+        name: Q(**{f'{field}__gte': to_bound(start), f'{field}__lt': to_bound(end)})
+        for name, (start, end) in dashboard_windows(today).items()
+    }
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _main_dashboard_payload(today, totals, customers):
+    return {
+        'current_year': today.year,
+        'today_metrics': {
+            'sales_count': totals['today_sales_count'] or 0,
+            'total_sales': totals['today_total_sales'] or 0,
+            'total_items_sold': totals['today_total_items'] or 0,
+            'unique_customers': customers['today_unique_customers'],
+        },
+        'yesterday_total_sales': totals['yesterday_total_sales'] or 0,
+        'current_week_sales': totals['current_week_total_sales'] or 0,
+        'last_week_sales': totals['last_week_total_sales'] or 0,
+        'all_time_totals': {
+            'total_sales': totals['total_sales'],
+            'total_orders': totals['total_orders'] or 0,
+            'total_customers': customers['total_customers'],
+        },
+    }
+
+
+def main_dashboard_metrics(today):
+    """
+    Main dashboard figures from the rollup tables: one conditional aggregation over
+    the daily totals and one over the daily customers, covering every window at once.
+    """
+    windows = _window_filters('date', today)
+    totals = DailySalesRollup.objects.aggregate(
+        today_sales_count=Sum('receipt_count', filter=windows['today']),
+        today_total_sales=Sum('gross_sales', filter=windows['today']),
+        today_total_items=Sum('quantity', filter=windows['today']),
+        yesterday_total_sales=Sum('gross_sales', filter=windows['yesterday']),
+        current_week_total_sales=Sum('gross_sales', filter=windows['current_week']),
+        last_week_total_sales=Sum('gross_sales', filter=windows['last_week']),
+        total_sales=Sum('gross_sales'),
+        total_orders=Sum('receipt_count'),
+    )
+    customers = DailyCustomerRollup.objects.aggregate(
+        today_unique_customers=Count('customer_name', distinct=True, filter=windows['today']),
+        total_customers=Count('customer_name', distinct=True),
+    )
+    return _main_dashboard_payload(today, totals, customers)
+
+
+def receipt_window_metrics(today):
+    """
+    The same figures straight from RECEIPTS2_FIX in a single query, filtering
+    `created_at` on half-open local-midnight ranges so the created_at index applies.
+    """
+    windows = _window_filters('created_at', today, to_bound=_local_midnight)
+    amount = F('selling_price') * F('quantity')
+    totals = RECEIPTS2_FIX.objects.order_by().aggregate(
+        today_sales_count=Count('id', filter=windows['today']),
+        today_total_sales=Sum(amount, filter=windows['today']),
+        today_total_items=Sum('quantity', filter=windows['today']),
+        today_unique_customers=Count('customer_name', distinct=True, filter=windows['today']),
+        yesterday_total_sales=Sum(amount, filter=windows['yesterday']),
+        current_week_total_sales=Sum(amount, filter=windows['current_week']),
+        last_week_total_sales=Sum(amount, filter=windows['last_week']),
+        total_sales=Sum(amount),
+        total_orders=Count('id'),
+        total_customers=Count('customer_name', distinct=True),
+    )
+    return _main_dashboard_payload(today, totals, totals)
@@ -1,8 +1,16 @@
+import threading
+import time
+
+import firebase_admin
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from google.auth.transport import requests as google_requests
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from firebase_admin import auth
+from .cache_utils import get_version, bump_version
 from .models import AuthorizedFirebaseToken
 import logging
 
@@ -10,6 +18,104 @@ from .throttles import POSAuthThrottle
 
 logger = logging.getLogger('django')
 
+AUTHORIZED_UIDS_NAMESPACE = 'AUTHORIZED_FIREBASE_UIDS'
+AUTHORIZED_UIDS_CACHE_TIMEOUT = 24 * 3600
+# How long a worker trusts its in-memory UID set before checking the shared version again
+AUTHORIZED_UIDS_CHECK_SECONDS = 5
+# Google's public keys for Firebase ID tokens, the URL verify_id_token checks signatures against
+ID_TOKEN_CERT_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+# firebase_admin only refetches the Google certificates once their cache headers expire,
+# so touching them this often keeps that refetch off the login path
+CERTIFICATE_REFRESH_SECONDS = 600
+CERTIFICATE_FETCH_TIMEOUT = 10
+
+# (version, uids, checked_at), swapped as a whole so readers never see a partial update
+_authorized_uids = (None, frozenset(), 0.0)
+
+
+def authorized_uids():
+    """
+    The set of authorized Firebase UIDs. Each worker keeps it in memory and only
+    reloads it, from Redis or else the table, when the shared version has moved.
+    """
+    global _authorized_uids
+    version, uids, checked_at = _authorized_uids
+    now = time.monotonic()
+    if version is not None and now - checked_at < AUTHORIZED_UIDS_CHECK_SECONDS:
+        return uids
+
+    latest = get_version(AUTHORIZED_UIDS_NAMESPACE)
+    if latest != version:
+        key = f'{AUTHORIZED_UIDS_NAMESPACE}_{latest}'
+        uids = cache.get(key)
+        if uids is None:
+            uids = frozenset(AuthorizedFirebaseToken.objects.values_list('token', flat=True))
+            cache.set(key, uids, timeout=AUTHORIZED_UIDS_CACHE_TIMEOUT)
+    _authorized_uids = (latest, uids, now)
+    return uids
+
+
+def invalidate_authorized_uids(**kwargs):
+    """post_save / post_delete receiver for AuthorizedFirebaseToken"""
+    global _authorized_uids
+    # Bumped after commit so no worker reloads the old rows under the new version
+    transaction.on_commit(lambda: bump_version(AUTHORIZED_UIDS_NAMESPACE))
+    _authorized_uids = (None, frozenset(), 0.0)
+
+
+def _certificate_request(app):
+    """
+    A google.auth transport over the cache-control session firebase_admin verifies ID
+    tokens with, so certificates fetched through it land in the cache logins read from.
+    firebase_admin has no public handle on that session; None if it is no longer there.
+    """
+    try:
+        session = auth._get_client(app)._token_verifier.request.session
+    except AttributeError:
+        return None
+    return google_requests.Request(session=session)
+
+
+def _warm_firebase_auth():
+    # Importing FCMManager initializes the default Firebase app
+    from . import FCMManager  # noqa: F401
+    certificate_request = _certificate_request(firebase_admin.get_app())
+    if certificate_request is None:
+        logger.warning("firebase_admin no longer exposes its certificate session, "
+                       "only the authorized UIDs are prewarmed")
+    while True:
+        close_old_connections()
+        try:
+            authorized_uids()
+        except Exception as e:
+            logger.warning(f"Failed to load authorized Firebase UIDs: {str(e)}")
+        finally:
+            # Sleeping for minutes, so don't keep a database connection open meanwhile
+            connection.close()
+        if certificate_request is not None:
+            try:
+                response = certificate_request(ID_TOKEN_CERT_URL, method='GET', timeout=CERTIFICATE_FETCH_TIMEOUT)
+                if response.status != 200:
+                    logger.warning(f"Failed to refresh Firebase certificates: HTTP {response.status}")
+            except Exception as e:
+                logger.warning(f"Failed to refresh Firebase certificates: {str(e)}")
+        time.sleep(CERTIFICATE_REFRESH_SECONDS)
+
+
+def prewarm_firebase_auth():
+    """
+    Load the authorized UIDs and Google's ID token certificates in the background, and
+    keep both fresh, so the first logins don't pay for them. Started from
+    AppConfig.ready when settings.FIREBASE_AUTH_PREWARM is set.
+    """
+    def run():
+        try:
+            _warm_firebase_auth()
+        except Exception as e:
+            logger.warning(f"Firebase auth prewarm failed: {str(e)}")
+
+    threading.Thread(target=run, name='firebase-auth-prewarm', daemon=True).start()
+
 
 class FirebaseAuthTokenView(APIView):
     throttle_classes = [POSAuthThrottle]
@@ -26,7 +132,7 @@ class FirebaseAuthTokenView(APIView):
             decoded_token = auth.verify_id_token(firebase_token)
             uid = decoded_token['uid']
 
-            if not AuthorizedFirebaseToken.objects.filter(token=uid).exists():
+            if uid not in authorized_uids():
                 logger.warning(f"Failed JWT token request from IP: {request_ip} with error: Unauthorized token")
                 return Response({'detail': 'Unauthorized Firebase token'}, status=status.HTTP_403_FORBIDDEN)
 
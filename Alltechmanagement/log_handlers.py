@@ -0,0 +1,139 @@
+import copy
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueListener
+
+
+class BatchingFileHandler(logging.FileHandler):
+    """FileHandler that flushes every `batch_size` records instead of after each one"""
+
+    def __init__(self, filename, batch_size=100, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.batch_size = batch_size
+        self.pending = 0
+
+    def emit(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.pending = 0
+        super().flush()
+
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers whenever the queue has been idle for `flush_interval`"""
+
+    def __init__(self, queue_, *handlers, flush_interval=1.0):
+        super().__init__(queue_, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+
+class QueuedFileHandler(logging.Handler):
+    """
+    Logging handler for request paths: records are put on an in-memory queue and a
+    background thread writes them to `filename` in batches, so the caller never waits
+    on disk I/O. Records still queued are written when logging shuts down.
+
+    A plain Handler rather than a QueueHandler subclass, because on Python 3.12+
+    dictConfig builds QueueHandler subclasses itself and would not pass `filename`.
+    """
+
+    def __init__(self, filename, batch_size=100, flush_interval=1.0, mode='a', encoding=None):
+        super().__init__()
+        self.queue = queue.SimpleQueue()
+        self.target = BatchingFileHandler(filename, batch_size=batch_size, mode=mode, encoding=encoding)
+        self.flush_interval = flush_interval
+        self.listener = None
+        self.listener_pid = None
+        self.listener_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def setLevel(self, level):
+        super().setLevel(level)
+        self.target.setLevel(level)
+
+    def _ensure_listener(self):
+        # Started per process, as forked server workers do not inherit the parent's thread
+        if self.listener_pid == os.getpid():
+            return
+        with self.listener_lock:
+            if self.listener_pid != os.getpid():
+                self.listener = FlushingQueueListener(self.queue, self.target, flush_interval=self.flush_interval)
+                self.listener.start()
+                self.listener_pid = os.getpid()
+
+    def prepare(self, record):
+        """Merge the arguments into the message now, before the caller can change them"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            self._ensure_listener()
+            self.queue.put_nowait(self.prepare(record))
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self.listener is not None and self.listener_pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
+
+
+class SampledLogFilter(logging.Filter):
+    """
+    Lets the first of each distinct message through once per `interval` seconds and drops
+    the repeats, noting how many were dropped on the next one that passes.
+    """
+    MAX_TRACKED = 10_000
+
+    def __init__(self, interval=60, name=''):
+        super().__init__(name)
+        self.interval = interval
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self.lock:
+            if len(self.seen) > self.MAX_TRACKED:
+                self.seen.clear()
+            passed_at, suppressed = self.seen.get(key, (None, 0))
+            if passed_at is not None and now - passed_at < self.interval:
+                self.seen[key] = (passed_at, suppressed + 1)
+                return False
+            self.seen[key] = (now, 0)
+        if suppressed:
+            record.msg = f'{record.msg} ({suppressed} similar messages suppressed)'
+        return True
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Lower
+
+from Alltechmanagement.models import SHOP2_STOCK_FIX, SAVED_TRANSACTIONS2_FIX, RECEIPTS2_FIX, LcdCustomers
+
+
+class Command(BaseCommand):
+    help = ('Link saved transactions and receipts to their stock row (and receipts to their customer) '
+            'by matching the stored names. Safe to re-run; only rows without a link are touched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per UPDATE, by id range')
+
+    def handle(self, *args, **options):
+        # Names are matched case-insensitively through the lower(name) indexes
+        product_id = Subquery(
+            SHOP2_STOCK_FIX.objects.alias(name_lower=Lower('product_name'))
+            .filter(name_lower=Lower(OuterRef('product_name'))).values('id')[:1]
+        )
+        customer_id = Subquery(
+            LcdCustomers.objects.alias(name_lower=Lower('customer_name'))
+            .filter(name_lower=Lower(OuterRef('customer_name'))).values('id')[:1]
+        )
+        links = [
+            (SAVED_TRANSACTIONS2_FIX, 'product', product_id),
+            (RECEIPTS2_FIX, 'product', product_id),
+            (RECEIPTS2_FIX, 'customer', customer_id),
+        ]
+        for model, field, value in links:
+            linked = self.backfill(model, field, value, options['batch_size'])
+            unlinked = model.objects.filter(**{f'{field}__isnull': True}).count()
+            self.stdout.write(f'{model.__name__}.{field}: linked {linked}, {unlinked} still unmatched')
+
+    def backfill(self, model, field, value, batch_size):
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        linked = 0
+        for start in range(0, last_id, batch_size):
+            with transaction.atomic():
+                linked += model.objects.filter(
+                    id__gt=start, id__lte=start + batch_size, **{f'{field}__isnull': True}
+                ).alias(match=value).filter(match__isnull=False).update(**{field: value})
+        return linked
@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Alltechmanagement.admin_apis import invalidate_dashboard_caches
+from Alltechmanagement.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the sales rollup tables from RECEIPTS2_FIX'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild days from this date onwards (YYYY-MM-DD). Defaults to the full history.',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+
+        written = rebuild_rollups(since=since)
+        invalidate_dashboard_caches()
+
+        for table, count in written.items():
+            self.stdout.write(f'{table}: {count} rows')
+        self.stdout.write(self.style.SUCCESS('Sales rollups rebuilt'))
@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Alltechmanagement.celery_jwt import CeleryJWTAuthentication
+from Alltechmanagement.custom_auth import CustomJWTAuthentication, CustomUser
+
+
+def legacy_pos_authenticate(request):
+    """What CustomJWTAuthentication did per request: a fresh validator and a full signature check"""
+    jwt_auth = JWTAuthentication()
+    raw_token = jwt_auth.get_raw_token(jwt_auth.get_header(request))
+    validated_token = jwt_auth.get_validated_token(raw_token)
+    return CustomUser(firebase_uid=validated_token['firebase_uid'], is_authenticated=True), validated_token
+
+
+class Command(BaseCommand):
+    help = ('Measure the per-request cost of authenticating POS and Celery access tokens, '
+            'with and without the verified-token cache.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20_000, help='Authentications per run')
+        parser.add_argument('--tokens', type=int, default=20,
+                            help='Distinct tokens the requests rotate through (default 20)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per plan')
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+
+        def requests_for(claim, value):
+            requests = []
+            for i in range(options['tokens']):
+                refresh = RefreshToken()
+                refresh[claim] = value(i)
+                requests.append(factory.get('/', HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}'))
+            return requests
+
+        pos_requests = requests_for('firebase_uid', lambda i: f'benchmark-uid-{i}')
+        celery_requests = requests_for('is_celery', lambda i: True)
+        pos_auth = CustomJWTAuthentication()
+        celery_auth = CeleryJWTAuthentication()
+
+        plans = {
+            'POS, validated every request': (legacy_pos_authenticate, pos_requests),
+            'POS, verified-token cache': (pos_auth.authenticate, pos_requests),
+            'Celery, verified-token cache': (celery_auth.authenticate, celery_requests),
+        }
+        count = options['requests']
+        for name, (authenticate, requests) in plans.items():
+            for request in requests:
+                authenticate(request)  # warm up
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                for i in range(count):
+                    authenticate(requests[i % len(requests)])
+                timings.append((time.perf_counter() - start) * 1_000_000 / count)
+            self.stdout.write(
+                f'{name:<32} median {statistics.median(timings):8.2f} us/request   '
+                f'min {min(timings):8.2f} us/request'
+            )
@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+from datetime import datetime, time as day_start, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from Alltechmanagement.dashboard import main_dashboard_metrics, receipt_window_metrics
+from Alltechmanagement.models import RECEIPTS2_FIX
+from Alltechmanagement.rollups import rebuild_rollups
+
+
+def legacy_main_dashboard(today):
+    """The five per-window queries main_dashboard used to run against RECEIPTS2_FIX"""
+    current_year = today.year
+    amount = F('selling_price') * F('quantity')
+    today_metrics = RECEIPTS2_FIX.objects.filter(
+        created_at__date=today, created_at__year=current_year
+    ).aggregate(
+        sales_count=Count('id'), total_sales=Sum(amount), total_items_sold=Sum('quantity'),
+        unique_customers=Count('customer_name', distinct=True)
+    )
+    yesterday = today - timedelta(days=1)
+    current_week_start = today - timedelta(days=today.weekday())
+    last_week_start = current_week_start - timedelta(days=7)
+    yesterday_metrics = RECEIPTS2_FIX.objects.filter(
+        created_at__date=yesterday, created_at__year=current_year
+    ).aggregate(total_sales=Sum(amount))
+    current_week_sales = RECEIPTS2_FIX.objects.filter(
+        created_at__date__gte=current_week_start, created_at__year=current_year
+    ).aggregate(total_sales=Sum(amount))
+    last_week_sales = RECEIPTS2_FIX.objects.filter(
+        created_at__date__range=[last_week_start, current_week_start - timedelta(days=1)],
+        created_at__year=current_year
+    ).aggregate(total_sales=Sum(amount))
+    all_time_totals = RECEIPTS2_FIX.objects.aggregate(
+        total_sales=Sum(amount), total_orders=Count('id'), total_customers=Count('customer_name', distinct=True)
+    )
+    return today_metrics, yesterday_metrics, current_week_sales, last_week_sales, all_time_totals
+
+
+class Command(BaseCommand):
+    help = ('Compare the legacy per-window main_dashboard queries with the single-pass receipts '
+            'query and the rollup read on a seeded receipts table. Runs inside a transaction that '
+            'is rolled back, so nothing seeded is kept.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Receipts to seed (default 1,000,000)')
+        parser.add_argument('--days', type=int, default=3 * 365, help='Spread seeded receipts over this many days')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per plan')
+        parser.add_argument('--explain', action='store_true', help='Print the query plans (Postgres)')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        with transaction.atomic():
+            self.seed(options['rows'], options['days'])
+            self.stdout.write('Building rollups...')
+            rebuild_rollups()
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE "Alltechmanagement_receipts2_fix"')
+
+            plans = {
+                'legacy (5 queries, __date/__year)': lambda: legacy_main_dashboard(today),
+                'single pass over receipts': lambda: receipt_window_metrics(today),
+                'rollup tables': lambda: main_dashboard_metrics(today),
+            }
+            for name, plan in plans.items():
+                plan()  # warm up
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    plan()
+                    timings.append((time.perf_counter() - start) * 1000)
+                self.stdout.write(
+                    f'{name:<36} median {statistics.median(timings):9.2f} ms   '
+                    f'min {min(timings):9.2f} ms'
+                )
+
+            if options['explain'] and connection.vendor == 'postgresql':
+                self.explain(today)
+
+            transaction.set_rollback(True)
+
+    def seed(self, rows, days):
+        self.stdout.write(f'Seeding {rows} receipts over {days} days...')
+        now = timezone.now()
+        products = [f'Benchmark Screen {i}' for i in range(300)]
+        customers = [f'benchmark customer {i}' for i in range(3000)] + ['null']
+        batch = []
+        for _ in range(rows):
+            batch.append(RECEIPTS2_FIX(
+                product_name=random.choice(products),
+                selling_price=Decimal(random.randrange(500, 20000, 50)),
+                quantity=random.randint(1, 3),
+                customer_name=random.choice(customers),
+                created_at=now - timedelta(seconds=random.randrange(days * 86400)),
+            ))
+            if len(batch) == 10_000:
+                RECEIPTS2_FIX.objects.bulk_create(batch)
+                batch = []
+        RECEIPTS2_FIX.objects.bulk_create(batch)
+
+    def explain(self, today):
+        yesterday = today - timedelta(days=1)
+        legacy = RECEIPTS2_FIX.objects.filter(
+            created_at__date=yesterday, created_at__year=today.year
+        ).order_by()
+        self.stdout.write('\nLegacy yesterday window (one of five):')
+        self.stdout.write(legacy.explain(analyze=True))
+
+        windowed = RECEIPTS2_FIX.objects.filter(
+            created_at__gte=timezone.make_aware(datetime.combine(yesterday, day_start.min)),
+            created_at__lt=timezone.make_aware(datetime.combine(today, day_start.min)),
+        ).order_by()
+        self.stdout.write('\nHalf-open created_at range for the same window:')
+        self.stdout.write(windowed.explain(analyze=True))
@@ -0,0 +1,57 @@
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+import httpx
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Load test sell_api over HTTP and report requests/sec and latency. Point it at the same '
+            'staging database served two ways, e.g. '
+            '`gunicorn djangoProject15.wsgi -w 4` and '
+            '`gunicorn djangoProject15.asgi:application -w 4 -k uvicorn.workers.UvicornWorker`. '
+            'Every request sells one unit of --product-id, so give it enough stock.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server base URL')
+        parser.add_argument('--token', required=True, help='POS access token (Bearer)')
+        parser.add_argument('--product-id', type=int, required=True)
+        parser.add_argument('--product-name', default='Benchmark Screen')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        latencies, statuses, elapsed = asyncio.run(self.run(options))
+        self.stdout.write(f"{options['requests']} requests, concurrency {options['concurrency']}")
+        self.stdout.write(f"throughput   {len(latencies) / elapsed:9.1f} req/s")
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(f"latency      p50 {quantiles[49]:.1f} ms   p95 {quantiles[94]:.1f} ms   "
+                          f"p99 {quantiles[98]:.1f} ms")
+        self.stdout.write(f"status codes {dict(statuses)}")
+
+    async def run(self, options):
+        url = f"{options['url'].rstrip('/')}/api/sell2/{options['product_id']}"
+        body = {'product_name': options['product_name'], 'price': '1000', 'quantity': 1,
+                'customer_name': 'benchmark'}
+        headers = {'Authorization': f"Bearer {options['token']}"}
+        remaining = iter(range(options['requests']))
+        latencies, statuses = [], Counter()
+
+        async def worker(client):
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=body, headers=headers)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(options['concurrency'])))
+            elapsed = time.perf_counter() - start
+        return latencies, statuses, elapsed
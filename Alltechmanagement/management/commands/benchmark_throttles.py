@@ -0,0 +1,92 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import SimpleRateThrottle
+
+from Alltechmanagement import throttles
+
+THROTTLES = [
+    throttles.InventoryModificationThrottle,
+    throttles.SalesOperationsThrottle,
+    throttles.OrderManagementThrottle,
+    throttles.InventoryCheckThrottle,
+    throttles.DashBoardThrottle,
+]
+
+
+class BenchmarkUser:
+    is_authenticated = True
+    firebase_uid = 'benchmark-throttle-user'
+
+    class data:
+        id = 'benchmark-throttle-user'
+
+
+def history_list(throttle_class):
+    """The same throttle on DRF's stock timestamp-history implementation"""
+    class HistoryThrottle(throttle_class):
+        allow_request = SimpleRateThrottle.allow_request
+        wait = SimpleRateThrottle.wait
+    return HistoryThrottle
+
+
+class Command(BaseCommand):
+    help = ('Measure the per-request cost of the API throttles at their configured rates, comparing '
+            "DRF's timestamp-history list with the Redis sliding-window script. Needs the Redis cache.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Throttle checks per run')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per throttle')
+
+    def handle(self, *args, **options):
+        if throttles._sliding_window_script() is None:
+            raise CommandError('The default cache is not Redis, so there is no sliding-window backend to measure')
+
+        request = APIRequestFactory().get('/')
+        request.user = BenchmarkUser()
+        count = options['requests']
+        for throttle_class in THROTTLES:
+            for name, implementation in (('history list', history_list(throttle_class)),
+                                         ('sliding window', throttle_class)):
+                key = implementation().get_cache_key(request, None)
+                timings = self.run(implementation, request, key, count, options['repeat'])
+                self.stdout.write(
+                    f'{throttle_class.__name__:<30} {throttle_class.rate:>11} {name:<15} '
+                    f'median {statistics.median(timings):8.1f} us/request   min {min(timings):8.1f} us/request'
+                )
+
+    def run(self, throttle_class, request, key, count, repeat):
+        """
+        Requests arrive exactly at the configured rate on a simulated clock, so every
+        check sees a full window, the worst case for the history list.
+        """
+        clock = [time.time()]
+
+        class SimulatedClock(throttle_class):
+            def timer(self):
+                return clock[0]
+
+        num_requests, duration = throttle_class().parse_rate(throttle_class.rate)
+        step = duration / num_requests
+        timings = []
+        for _ in range(repeat):
+            self.reset(key)
+            for _ in range(num_requests):
+                SimulatedClock().allow_request(request, None)
+                clock[0] += step
+
+            start = time.perf_counter()
+            for _ in range(count):
+                SimulatedClock().allow_request(request, None)
+                clock[0] += step
+            timings.append((time.perf_counter() - start) * 1_000_000 / count)
+        self.reset(key)
+        return timings
+
+    @staticmethod
+    def reset(key):
+        cache.delete(key)
+        cache.delete_pattern(f'{key}:*')
@@ -0,0 +1,21 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from Alltechmanagement.search_sync import OUTBOX_BATCH_SIZE, requeue_parked, run_outbox_worker
+
+
+class Command(BaseCommand):
+    help = 'Drain the search index outbox to Meilisearch, polling for new entries until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain what is queued now and exit')
+        parser.add_argument('--requeue-parked', action='store_true',
+                            help='Retry entries parked after too many failed attempts before draining')
+
+    def handle(self, *args, **options):
+        if options['requeue_parked']:
+            self.stdout.write(f'Requeued {requeue_parked()} parked outbox entries')
+        asyncio.run(run_outbox_worker(options['batch_size'], options['interval'], options['once']))
@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+
+import httpx
+from django.core.management.base import BaseCommand
+
+from Alltechmanagement.models import SHOP2_STOCK_FIX
+from Alltechmanagement.search_sync import product_document, search_index_client
+
+DOCUMENT_FIELDS = ['id', 'product_name', 'price', 'quantity']
+
+
+def checksum(document):
+    canonical = json.dumps({field: document.get(field) for field in DOCUMENT_FIELDS}, sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Reconcile the Shop2Stock search index with SHOP2_STOCK_FIX, pushing only documents that '
+            'differ and removing ones whose product is gone. With --full, rebuild the whole index '
+            'into a fresh one and swap it in.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild into a new index and swap it in')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per DB chunk and documents per push')
+        parser.add_argument('--dry-run', action='store_true', help='Only report drift, do not write to the index')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = asyncio.run(self.rebuild(options) if options['full'] else self.reconcile(options))
+        elapsed = time.perf_counter() - start
+        scanned = counts.pop('scanned', 0)
+        self.stdout.write(f'Scanned {scanned} products in {elapsed:.2f}s ({scanned / elapsed:.0f} docs/s)')
+        self.stdout.write(', '.join(f'{name}: {count}' for name, count in sorted(counts.items())))
+
+    def stock_documents(self, chunk_size):
+        rows = SHOP2_STOCK_FIX.objects.order_by('id').values(*DOCUMENT_FIELDS)
+        return (product_document(row) async for row in rows.aiterator(chunk_size=chunk_size))
+
+    async def reconcile(self, options):
+        chunk_size, dry_run = options['chunk_size'], options['dry_run']
+        counts = Counter()
+        async with search_index_client(max_batch=chunk_size) as search_index:
+            indexed = {
+                document['id']: checksum(document)
+                async for document in search_index.get_documents(fields=DOCUMENT_FIELDS, batch_size=chunk_size)
+            }
+
+            pending = []
+            async for document in self.stock_documents(chunk_size):
+                counts['scanned'] += 1
+                existing = indexed.pop(document['id'], None)
+                if existing == checksum(document):
+                    counts['in_sync'] += 1
+                    continue
+                counts['missing' if existing is None else 'changed'] += 1
+                pending.append(document)
+                if len(pending) >= chunk_size and not dry_run:
+                    await search_index.add_documents(pending)
+                    pending = []
+
+            counts['stale'] = len(indexed)
+            if not dry_run:
+                if pending:
+                    await search_index.add_documents(pending)
+                if indexed:
+                    await search_index.delete_documents(list(indexed))
+        return counts
+
+    async def rebuild(self, options):
+        chunk_size = options['chunk_size']
+        counts = Counter()
+        async with search_index_client(max_batch=chunk_size) as search_index:
+            try:
+                settings = await search_index.get_settings()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                await search_index.wait_for_task(await search_index.create())
+                settings = await search_index.get_settings()
+
+            staging = search_index.using(f'{search_index.index_uid}_rebuild')
+            try:
+                await staging.wait_for_task(await staging.delete())
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+            await staging.wait_for_task(await staging.create())
+            await staging.wait_for_task(await staging.update_settings(settings))
+
+            tasks, pending = [], []
+            async for document in self.stock_documents(chunk_size):
+                counts['scanned'] += 1
+                pending.append(document)
+                if len(pending) >= chunk_size:
+                    tasks += await staging.add_documents(pending)
+                    pending = []
+            if pending:
+                tasks += await staging.add_documents(pending)
+            # Index tasks run in order, the last one finishing means they all have
+            if tasks:
+                await staging.wait_for_task(tasks[-1])
+            counts['indexed'] = counts['scanned']
+
+            await search_index.wait_for_task(await search_index.swap_with(staging.index_uid))
+            # After the swap the staging name holds the old documents
+            await staging.wait_for_task(await staging.delete())
+        return counts
@@ -3,22 +3,51 @@ from decimal import Decimal
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, Group, Permission, \
     AbstractUser
 from django.core.validators import MinValueValidator
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import TrigramSimilarity
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
+class ProductNameQuerySet(models.QuerySet):
+    def name_iexact(self, product_name):
+        """Case-insensitive name match written against lower(product_name) so it can use the index"""
+        return self.alias(name_lower=Lower('product_name')).filter(name_lower=product_name.lower())
+
+    def name_search(self, query):
+        """Typo tolerant search ranked by trigram similarity, served by the pg_trgm index"""
+        query = query.lower()
+        return self.alias(name_lower=Lower('product_name')).filter(
+            Q(name_lower__trigram_similar=query) | Q(name_lower__contains=query)
+        ).annotate(similarity=TrigramSimilarity(Lower('product_name'), query)).order_by('-similarity')
+
+
 #NEW SYSTEM
 class SHOP2_STOCK_FIX(models.Model):
     product_name = models.CharField(max_length=100, unique=True)
     quantity = models.IntegerField()
     price = models.DecimalField(decimal_places=2, max_digits=7)
 
+    objects = ProductNameQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Case-insensitive exact lookups and trigram (fuzzy / substring) searches
+            models.Index(Lower('product_name'), name='stock_name_lower_idx'),
+            GinIndex(OpClass(Lower('product_name'), name='gin_trgm_ops'), name='stock_name_trgm_idx'),
+        ]
+
     def __str__(self):
         return self.product_name
 
 
 class SAVED_TRANSACTIONS2_FIX(models.Model):
     product_name = models.CharField(max_length=100)
+    # Null for rows saved before the link existed and not matched by backfill_product_links
+    product = models.ForeignKey(SHOP2_STOCK_FIX, null=True, blank=True, on_delete=models.SET_NULL,
+                                related_name='saved_transactions')
     selling_price = models.DecimalField(max_digits=7, decimal_places=2)
     quantity = models.IntegerField()
     customer_name = models.CharField(max_length=255, default='null')
@@ -46,6 +75,10 @@ class COMPLETED_TRANSACTIONS2_FIX(models.Model):
 class RECEIPTS2_FIX(models.Model):
     # Existing fields with enhancements
     product_name = models.CharField(max_length=100)
+    product = models.ForeignKey(SHOP2_STOCK_FIX, null=True, blank=True, on_delete=models.SET_NULL,
+                                related_name='receipts')
+    customer = models.ForeignKey('LcdCustomers', null=True, blank=True, on_delete=models.SET_NULL,
+                                 related_name='receipts')
     selling_price = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -72,21 +105,41 @@ class RECEIPTS2_FIX(models.Model):
     def __str__(self):
         return f"{self.product_name} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
 
+    objects = ProductNameQuerySet.as_manager()
+
     class Meta:
         indexes = [
             models.Index(fields=['created_at', 'product_name']),
             models.Index(fields=['created_at', 'customer_name']),
+            models.Index(Lower('product_name'), name='receipt_name_lower_idx'),
+            GinIndex(OpClass(Lower('product_name'), name='gin_trgm_ops'), name='receipt_name_trgm_idx'),
         ]
         ordering = ['-created_at']
 
 
 class SALE_SUMMARY_FIX(models.Model):
-    created_at = models.DateTimeField(auto_now_add=True)
-    total = models.IntegerField()
+    """Per-product sales totals for one period: a calendar year ('2025') or all time."""
+    ALL_TIME = 'all'
+
+    period = models.CharField(max_length=4)
     product_name = models.CharField(max_length=100)
+    receipt_count = models.IntegerField(default=0)
+    gross_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_sold_at = models.DateTimeField()
+    last_sold_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'product_name'], name='unique_sale_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['period', '-gross_sales']),
+        ]
 
     def __str__(self):
-        return self.product_name
+        return f"{self.period} {self.product_name}"
 
 
 class PushNotificationToken(models.Model):
@@ -103,4 +156,177 @@ class AuthorizedFirebaseToken(models.Model):
 class LcdCustomers(models.Model):
     customer_name = models.CharField(max_length=255, unique=True)
     total_spent =  models.DecimalField(max_digits=12, decimal_places=2)
+    # Completed receipts and units bought, maintained alongside total_spent
+    visit_count = models.IntegerField(default=0)
+    total_items = models.IntegerField(default=0)
+    first_purchase_at = models.DateTimeField(null=True, blank=True)
+    last_purchase_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_spent']),
+            # Case-insensitive name matches (backfill_product_links)
+            models.Index(Lower('customer_name'), name='customer_name_lower_idx'),
+        ]
+
+
+
+class StockMovement(models.Model):
+    """
+    Append-only history of stock changes, written in the same transaction as the change.
+    SHOP2_STOCK_FIX.quantity stays the materialized current level; each movement also
+    records the level it left behind.
+    """
+    SALE = 'sale'
+    REFUND = 'refund'
+    RESTOCK = 'restock'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (SALE, 'Sale'),
+        (REFUND, 'Refund'),
+        (RESTOCK, 'Restock'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    # No constraint and no cascade: rows keep the product id after the product is deleted,
+    # so its history (ending in the adjustment to zero) stays queryable
+    product = models.ForeignKey(SHOP2_STOCK_FIX, on_delete=models.DO_NOTHING, db_constraint=False,
+                                related_name='movements')
+    product_name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity_change = models.IntegerField()
+    quantity_after = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-created_at']),
+            models.Index(fields=['kind', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_name} {self.kind} {self.quantity_change:+d}"
+
+
+class TransactionRefund(models.Model):
+    """Ledger of refunds against saved transactions, full or partial."""
+    saved_transaction_id = models.IntegerField(db_index=True)
+    product = models.ForeignKey(SHOP2_STOCK_FIX, null=True, blank=True, on_delete=models.SET_NULL,
+                                related_name='refunds')
+    product_name = models.CharField(max_length=100)
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    selling_price = models.DecimalField(max_digits=7, decimal_places=2)
+    customer_name = models.CharField(max_length=255, default='null')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.product_name} x{self.quantity} - {self.created_at}"
+
 
+class SearchIndexOutbox(models.Model):
+    """
+    A product whose search document needs re-syncing. Written in the same transaction
+    as the stock change and drained to Meilisearch by the drain_search_outbox worker.
+    """
+    product_id = models.IntegerField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+    # Null once the entry is parked after OUTBOX_MAX_ATTEMPTS failed syncs; it is kept with
+    # its last_error until requeued (drain_search_outbox --requeue-parked)
+    available_at = models.DateTimeField(default=timezone.now, null=True, db_index=True)
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"{self.product_id} - {self.created_at}"
+
+
+class DailySalesRollup(models.Model):
+    """Per-day sales totals maintained incrementally from RECEIPTS2_FIX."""
+    date = models.DateField(unique=True)
+    receipt_count = models.IntegerField(default=0)
+    gross_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=0)
+    max_sale = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.gross_sales}"
+
+
+class HourlySalesRollup(models.Model):
+    """Per-hour sales totals, used for the time-of-day sales patterns."""
+    date = models.DateField()
+    hour = models.SmallIntegerField()
+    receipt_count = models.IntegerField(default=0)
+    gross_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'hour'], name='unique_hourly_sales_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}:00 - {self.gross_sales}"
+
+
+class DailyProductRollup(models.Model):
+    """Per-day, per-product sales totals."""
+    date = models.DateField()
+    product_name = models.CharField(max_length=100)
+    receipt_count = models.IntegerField(default=0)
+    gross_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=0)
+    # Sum of unit prices, so the average selling price can be derived without the receipts
+    price_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_sold_at = models.DateTimeField()
+    last_sold_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product_name'], name='unique_daily_product_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['product_name', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_name}"
+
+
+class DailyCustomerRollup(models.Model):
+    """Per-day, per-customer sales totals."""
+    date = models.DateField()
+    customer_name = models.CharField(max_length=255)
+    receipt_count = models.IntegerField(default=0)
+    gross_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity = models.IntegerField(default=0)
+    first_purchased_at = models.DateTimeField()
+    last_purchased_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'customer_name'], name='unique_daily_customer_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['customer_name', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.customer_name}"
+
+
+class ProductCustomerRollup(models.Model):
+    """Distinct product/customer pairs per year, for unique-customer counts per product."""
+    year = models.SmallIntegerField()
+    product_name = models.CharField(max_length=100)
+    customer_name = models.CharField(max_length=255)
+    receipt_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'product_name', 'customer_name'],
+                                    name='unique_product_customer_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.year} {self.product_name} - {self.customer_name}"
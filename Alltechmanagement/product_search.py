@@ -0,0 +1,206 @@
+import bisect
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from Alltechmanagement.cache_utils import get_version, abump_version
+from Alltechmanagement.models import SHOP2_STOCK_FIX
+from Alltechmanagement.search_sync import product_document
+
+# Candidates sharing less than this fraction of trigrams with the query are dropped
+SIMILARITY_THRESHOLD = 0.2
+
+# Every stock write publishes the product ids it changed under its SHOP_STOCK version,
+# so other workers re-read just those rows instead of rebuilding the whole index
+STOCK_DELTA_TIMEOUT = 600
+# Further behind than this, a worker rebuilds rather than replaying deltas
+MAX_DELTA_VERSIONS = 500
+# Writers bump the version before publishing its delta; a delta still missing after
+# this long was lost (expired, or the writer died) and forces a rebuild
+DELTA_GRACE_SECONDS = 2
+
+_WORD = re.compile(r'\w+')
+
+
+def _delta_key(version):
+    return f'SHOP_STOCK_DELTA_{version}'
+
+
+def _normalize(text):
+    return ' '.join(_WORD.findall(text.lower()))
+
+
+def _trigrams(text):
+    """pg_trgm style trigrams: each word padded with two leading spaces and one trailing"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductSearchIndex:
+    """
+    In-process product name index answering lookups without the search service.
+    Each worker builds it from SHOP2_STOCK_FIX on first use. Stock writes in this
+    worker patch it in place, writes in other workers are replayed from the per-version
+    deltas they publish; only a first load or a gap in the deltas rebuilds it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._documents = {}
+        self._names = {}
+        self._postings = {}
+        self._words = []
+        # (version, first seen) of a delta this worker is still waiting for
+        self._awaited_delta = None
+
+    def _add(self, document):
+        name = _normalize(document['product_name'])
+        self._documents[document['id']] = document
+        self._names[document['id']] = (name, _trigrams(name))
+        for gram in self._names[document['id']][1]:
+            self._postings.setdefault(gram, set()).add(document['id'])
+        for word in set(name.split()):
+            bisect.insort(self._words, (word, document['id']))
+
+    def _remove(self, product_id):
+        if product_id not in self._documents:
+            return
+        del self._documents[product_id]
+        name, grams = self._names.pop(product_id)
+        for gram in grams:
+            self._postings[gram].discard(product_id)
+        for word in set(name.split()):
+            position = bisect.bisect_left(self._words, (word, product_id))
+            del self._words[position]
+
+    def _rebuild(self, version):
+        self._documents, self._names, self._postings, self._words = {}, {}, {}, []
+        for product in SHOP2_STOCK_FIX.objects.values('id', 'product_name', 'price', 'quantity').iterator():
+            self._add(stock_document(product))
+        self._version = version
+
+    def apply(self, version, products=(), deleted_ids=()):
+        """
+        Patch in this worker's own stock writes. `version` is the SHOP_STOCK version
+        the write bumped to; if other writes happened in between the index is left to
+        rebuild on the next search instead.
+        """
+        with self._lock:
+            if self._version is None:
+                return
+            for product in products:
+                self._remove(product.id)
+                self._add(stock_document(product))
+            for product_id in deleted_ids:
+                self._remove(product_id)
+            if version == self._version + 1:
+                self._version = version
+
+    def _catch_up(self, version):
+        """Bring the index up to `version` from published deltas, rebuilding only on a gap"""
+        current = self._version
+        if current is None or not 0 < version - current <= MAX_DELTA_VERSIONS:
+            with self._lock:
+                if self._version == current:
+                    self._rebuild(version)
+            return
+
+        versions = range(current + 1, version + 1)
+        deltas = cache.get_many([_delta_key(v) for v in versions])
+        published = []
+        for v in versions:
+            if _delta_key(v) not in deltas:
+                break
+            published.append(v)
+        if len(published) < len(versions):
+            missing = versions[len(published)]
+            if self._awaited_delta is None or self._awaited_delta[0] != missing:
+                self._awaited_delta = (missing, time.monotonic())
+            elif time.monotonic() - self._awaited_delta[1] > DELTA_GRACE_SECONDS:
+                with self._lock:
+                    if self._version == current:
+                        self._rebuild(version)
+                return
+        if not published:
+            return
+
+        changed = set()
+        for v in published:
+            changed.update(deltas[_delta_key(v)])
+        rows = {
+            product['id']: product
+            for product in SHOP2_STOCK_FIX.objects.filter(id__in=changed).values('id', 'product_name', 'price', 'quantity')
+        }
+        with self._lock:
+            # Another thread moved the index meanwhile; the next search picks up from there
+            if self._version != current:
+                return
+            for product_id in changed:
+                self._remove(product_id)
+                if product_id in rows:
+                    self._add(stock_document(rows[product_id]))
+            self._version = published[-1]
+
+    def search(self, query, limit=20):
+        query = _normalize(query)
+        if not query:
+            return []
+        version = get_version('SHOP_STOCK')
+        if version != self._version:
+            self._catch_up(version)
+        with self._lock:
+            return self._search(query, limit)
+
+    def _search(self, query, limit):
+        query_grams = _trigrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+        # Short queries carry few trigrams, word prefixes catch what they miss
+        last_word = query.split()[-1]
+        position = bisect.bisect_left(self._words, (last_word,))
+        prefixed = set()
+        while position < len(self._words) and self._words[position][0].startswith(last_word):
+            prefixed.add(self._words[position][1])
+            position += 1
+
+        scored = []
+        for product_id in set(shared) | prefixed:
+            name, grams = self._names[product_id]
+            similarity = shared[product_id] / (len(query_grams) + len(grams) - shared[product_id])
+            score = similarity + (1 if query in name else 0) + (0.5 if product_id in prefixed else 0)
+            if score >= SIMILARITY_THRESHOLD:
+                scored.append((-score, name, product_id))
+        return [self._documents[product_id] for _, _, product_id in sorted(scored)[:limit]]
+
+
+def stock_document(product):
+    """Search document for a stock row given as a model instance or a values() dict"""
+    if isinstance(product, SHOP2_STOCK_FIX):
+        product = {'id': product.id, 'product_name': product.product_name, 'price': product.price,
+                   'quantity': product.quantity}
+    return product_document(product)
+
+
+product_search_index = ProductSearchIndex()
+
+
+async def stock_changed(products=(), deleted_ids=()):
+    """
+    Invalidate cached stock listings after a write, publish the changed ids for the
+    other workers' search indexes and patch this worker's one.
+    """
+    products = list(products)
+    version = await abump_version('SHOP_STOCK')
+    await cache.aset(
+        _delta_key(version), [product.id for product in products] + list(deleted_ids), timeout=STOCK_DELTA_TIMEOUT
+    )
+    await sync_to_async(product_search_index.apply)(version, products, deleted_ids)
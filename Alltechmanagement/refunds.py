@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models import F
+
+from Alltechmanagement.models import SHOP2_STOCK_FIX, SAVED_TRANSACTIONS2_FIX, TransactionRefund, StockMovement
+from Alltechmanagement.search_sync import enqueue_index_sync
+from Alltechmanagement.stock_ledger import movement, record_movements
+
+
+def refund_saved_transaction(transaction_id, quantity=None):
+    """
+    Return `quantity` units of a saved transaction to stock (all of them by default).
+    Stock is restored with a single F() update so concurrent sales are never lost,
+    the refund is recorded in the ledger, and a partial refund leaves the rest of the
+    transaction saved. Returns the refreshed stock row and the ledger entry.
+    """
+    with transaction.atomic():
+        saved = SAVED_TRANSACTIONS2_FIX.objects.select_for_update().get(pk=transaction_id)
+        if quantity is None:
+            quantity = saved.quantity
+        if not 0 < quantity <= saved.quantity:
+            raise ValueError(f'Can refund between 1 and {saved.quantity} units')
+
+        product_id = saved.product_id
+        if product_id is None:
+            # Rows saved before transactions were linked to their product
+            product_id = SHOP2_STOCK_FIX.objects.name_iexact(saved.product_name).values_list('id', flat=True).first()
+        if product_id is None or not SHOP2_STOCK_FIX.objects.filter(pk=product_id).update(
+                quantity=F('quantity') + quantity):
+            raise SHOP2_STOCK_FIX.DoesNotExist(f'No stock row for {saved.product_name}')
+
+        refund = TransactionRefund.objects.create(
+            saved_transaction_id=saved.id,
+            product_id=product_id,
+            product_name=saved.product_name,
+            quantity=quantity,
+            selling_price=saved.selling_price,
+            customer_name=saved.customer_name
+        )
+        if quantity == saved.quantity:
+            saved.delete()
+        else:
+            SAVED_TRANSACTIONS2_FIX.objects.filter(pk=saved.pk).update(quantity=F('quantity') - quantity)
+        enqueue_index_sync(product_id)
+        product = SHOP2_STOCK_FIX.objects.get(pk=product_id)
+        record_movements(movement(product, StockMovement.REFUND, quantity))
+        return product, refund
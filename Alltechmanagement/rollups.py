@@ -0,0 +1,309 @@
+import logging
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import ExtractHour, ExtractYear, Greatest, Least, TruncDate
+from django.utils import timezone
+
+from Alltechmanagement.models import RECEIPTS2_FIX, DailySalesRollup, HourlySalesRollup, DailyProductRollup, \
+    DailyCustomerRollup, ProductCustomerRollup, SALE_SUMMARY_FIX, LcdCustomers
+
+logger = logging.getLogger('django')
+
+
+def upsert_totals(model, lookup, sums, highest=None, lowest=None):
+    """
+    Add `sums` to the rollup row identified by `lookup`, creating it if needed.
+    `highest` / `lowest` fields keep the max / min of the stored and new values.
+    Returns True when a new row was created.
+    """
+    highest = highest or {}
+    lowest = lowest or {}
+    updates = {field: F(field) + value for field, value in sums.items()}
+    updates.update({field: Greatest(field, Value(value)) for field, value in highest.items()})
+    updates.update({field: Least(field, Value(value)) for field, value in lowest.items()})
+
+    if model.objects.filter(**lookup).update(**updates):
+        return False
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **sums, **highest, **lowest)
+        return True
+    except IntegrityError:
+        # Another worker created the row between our update and insert
+        model.objects.filter(**lookup).update(**updates)
+        return False
+
+
+def upsert_customer_totals(customers):
+    """
+    Add completed sales to LcdCustomers in one INSERT ... ON CONFLICT DO UPDATE, so
+    concurrent completions for the same customer never overwrite each other.
+    `customers` maps customer name to a dict of total_spent, visit_count, total_items,
+    first_purchase_at and last_purchase_at. Returns a name -> customer id mapping.
+    """
+    if not customers:
+        return {}
+    fields = [LcdCustomers._meta.get_field(name) for name in (
+        'customer_name', 'total_spent', 'visit_count', 'total_items', 'first_purchase_at', 'last_purchase_at'
+    )]
+    quote = connection.ops.quote_name
+    table = quote(LcdCustomers._meta.db_table)
+    rows, params = [], []
+    # Sorted so concurrent batches lock the customer rows in the same order
+    for name in sorted(customers):
+        values = {'customer_name': name, **customers[name]}
+        rows.append(f"({', '.join(['%s'] * len(fields))})")
+        params.extend(field.get_db_prep_save(values[field.name], connection) for field in fields)
+    columns = {field.name: quote(field.column) for field in fields}
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns.values())}) VALUES {', '.join(rows)} "
+        f"ON CONFLICT ({columns['customer_name']}) DO UPDATE SET "
+        + ', '.join(
+            f"{columns[name]} = {table}.{columns[name]} + EXCLUDED.{columns[name]}"
+            for name in ('total_spent', 'visit_count', 'total_items')
+        )
+        + f", {columns['first_purchase_at']} = LEAST({table}.{columns['first_purchase_at']}, "
+          f"EXCLUDED.{columns['first_purchase_at']})"
+        + f", {columns['last_purchase_at']} = GREATEST({table}.{columns['last_purchase_at']}, "
+          f"EXCLUDED.{columns['last_purchase_at']})"
+        + f" RETURNING {columns['customer_name']}, {quote(LcdCustomers._meta.pk.column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return dict(cursor.fetchall())
+
+
+def upsert_sale_summaries(summaries):
+    """
+    Add completed sales to SALE_SUMMARY_FIX in one INSERT ... ON CONFLICT DO UPDATE,
+    the same way as `upsert_customer_totals`. `summaries` maps (period, product_name)
+    to a dict of receipt_count, gross_sales, quantity, price_sum, first_sold_at and
+    last_sold_at.
+    """
+    if not summaries:
+        return
+    fields = [SALE_SUMMARY_FIX._meta.get_field(name) for name in (
+        'period', 'product_name', 'receipt_count', 'gross_sales', 'quantity', 'price_sum',
+        'first_sold_at', 'last_sold_at'
+    )]
+    quote = connection.ops.quote_name
+    table = quote(SALE_SUMMARY_FIX._meta.db_table)
+    rows, params = [], []
+    # Sorted so concurrent batches lock the summary rows in the same order
+    for period, product_name in sorted(summaries):
+        values = {'period': period, 'product_name': product_name, **summaries[period, product_name]}
+        rows.append(f"({', '.join(['%s'] * len(fields))})")
+        params.extend(field.get_db_prep_save(values[field.name], connection) for field in fields)
+    columns = {field.name: quote(field.column) for field in fields}
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns.values())}) VALUES {', '.join(rows)} "
+        f"ON CONFLICT ({columns['period']}, {columns['product_name']}) DO UPDATE SET "
+        + ', '.join(
+            f"{columns[name]} = {table}.{columns[name]} + EXCLUDED.{columns[name]}"
+            for name in ('receipt_count', 'gross_sales', 'quantity', 'price_sum')
+        )
+        + f", {columns['first_sold_at']} = LEAST({table}.{columns['first_sold_at']}, "
+          f"EXCLUDED.{columns['first_sold_at']})"
+        + f", {columns['last_sold_at']} = GREATEST({table}.{columns['last_sold_at']}, "
+          f"EXCLUDED.{columns['last_sold_at']})"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def customer_totals(sales, purchased_at):
+    """
+    Fold completed sales (anything with customer_name, selling_price and quantity)
+    into the per-customer totals taken by `upsert_customer_totals`.
+    """
+    customers = {}
+    for sale in sales:
+        totals = customers.setdefault(sale.customer_name, {
+            'total_spent': 0, 'visit_count': 0, 'total_items': 0,
+            'first_purchase_at': purchased_at, 'last_purchase_at': purchased_at,
+        })
+        totals['total_spent'] += sale.selling_price * sale.quantity
+        totals['visit_count'] += 1
+        totals['total_items'] += sale.quantity
+    return customers
+
+
+def _merge(bucket, key, sums, highest=None, lowest=None):
+    """Fold one receipt's contribution into an in-memory bucket keyed by rollup row."""
+    entry = bucket.get(key)
+    if entry is None:
+        bucket[key] = (dict(sums), dict(highest or {}), dict(lowest or {}))
+        return
+    entry_sums, entry_highest, entry_lowest = entry
+    for field, value in sums.items():
+        entry_sums[field] += value
+    for field, value in (highest or {}).items():
+        entry_highest[field] = max(entry_highest[field], value)
+    for field, value in (lowest or {}).items():
+        entry_lowest[field] = min(entry_lowest[field], value)
+
+
+def record_receipts(receipts):
+    """
+    Fold newly written receipts into the rollup tables.
+    Call inside the same transaction that created the receipts.
+    """
+    daily, hourly, products, customers, pairs, summaries = {}, {}, {}, {}, {}, {}
+
+    for receipt in receipts:
+        created_at = timezone.localtime(receipt.created_at)
+        day = created_at.date()
+        amount = receipt.selling_price * receipt.quantity
+        sums = {'receipt_count': 1, 'gross_sales': amount, 'quantity': receipt.quantity}
+
+        _merge(daily, (day,), sums, highest={'max_sale': amount})
+        _merge(hourly, (day, created_at.hour), sums)
+        product_sums = {**sums, 'price_sum': receipt.selling_price}
+        sold_at = ({'last_sold_at': receipt.created_at}, {'first_sold_at': receipt.created_at})
+        _merge(products, (day, receipt.product_name), product_sums, *sold_at)
+        for period in (str(day.year), SALE_SUMMARY_FIX.ALL_TIME):
+            _merge(summaries, (period, receipt.product_name), product_sums, *sold_at)
+        _merge(customers, (day, receipt.customer_name), sums,
+               highest={'last_purchased_at': receipt.created_at},
+               lowest={'first_purchased_at': receipt.created_at})
+        _merge(pairs, (day.year, receipt.product_name, receipt.customer_name), {'receipt_count': 1})
+
+    # Rows are upserted in key order so concurrent batches lock them in the same order
+    for (day,), (sums, highest, lowest) in sorted(daily.items()):
+        upsert_totals(DailySalesRollup, {'date': day}, sums, highest, lowest)
+    for (day, hour), (sums, highest, lowest) in sorted(hourly.items()):
+        upsert_totals(HourlySalesRollup, {'date': day, 'hour': hour}, sums, highest, lowest)
+    for (day, product_name), (sums, highest, lowest) in sorted(products.items()):
+        upsert_totals(DailyProductRollup, {'date': day, 'product_name': product_name}, sums, highest, lowest)
+    for (day, customer_name), (sums, highest, lowest) in sorted(customers.items()):
+        upsert_totals(DailyCustomerRollup, {'date': day, 'customer_name': customer_name}, sums, highest, lowest)
+    for (year, product_name, customer_name), (sums, highest, lowest) in sorted(pairs.items()):
+        upsert_totals(ProductCustomerRollup,
+                      {'year': year, 'product_name': product_name, 'customer_name': customer_name},
+                      sums, highest, lowest)
+    upsert_sale_summaries({key: {**sums, **highest, **lowest} for key, (sums, highest, lowest) in summaries.items()})
+
+
+def _summary_rows(product_rollups, period):
+    """SALE_SUMMARY_FIX rows for `period` folded from DailyProductRollup rows"""
+    for row in product_rollups.values('product_name').annotate(
+        receipts=Sum('receipt_count'), sales=Sum('gross_sales'), items=Sum('quantity'),
+        prices=Sum('price_sum'), first=Min('first_sold_at'), last=Max('last_sold_at'),
+    ):
+        yield SALE_SUMMARY_FIX(
+            period=period, product_name=row['product_name'], receipt_count=row['receipts'],
+            gross_sales=row['sales'], quantity=row['items'], price_sum=row['prices'],
+            first_sold_at=row['first'], last_sold_at=row['last'],
+        )
+
+
+def rebuild_rollups(since=None):
+    """
+    Recompute the rollup tables from RECEIPTS2_FIX.
+    With `since` (a date) only days from that date onwards are rebuilt; the
+    product/customer pairs and yearly product summaries are rebuilt from the
+    start of that year. The all-time product summary and the LcdCustomers
+    visit totals are always rebuilt.
+    Returns the number of rollup rows written per table.
+    """
+    receipts = RECEIPTS2_FIX.objects.order_by()
+    pair_receipts = RECEIPTS2_FIX.objects.order_by()
+    daily_tables = [DailySalesRollup, HourlySalesRollup, DailyProductRollup, DailyCustomerRollup]
+    if since is not None:
+        receipts = receipts.filter(created_at__date__gte=since)
+        pair_receipts = pair_receipts.filter(created_at__year__gte=since.year)
+
+    amount = F('selling_price') * F('quantity')
+    # Summed quantity is aliased so it does not shadow the receipt field inside `amount`
+    totals = dict(receipt_count=Count('id'), gross_sales=Sum(amount), items=Sum('quantity'))
+    receipts = receipts.annotate(date=TruncDate('created_at'))
+
+    def build(model, rows):
+        objs = []
+        for row in rows:
+            if 'items' in row:
+                row['quantity'] = row.pop('items')
+            objs.append(model(**row))
+        return len(model.objects.bulk_create(objs, batch_size=1000))
+
+    with transaction.atomic():
+        for model in daily_tables:
+            stale = model.objects.all()
+            if since is not None:
+                stale = stale.filter(date__gte=since)
+            stale.delete()
+        stale_pairs = ProductCustomerRollup.objects.all()
+        if since is not None:
+            stale_pairs = stale_pairs.filter(year__gte=since.year)
+        stale_pairs.delete()
+
+        written = {
+            DailySalesRollup.__name__: build(
+                DailySalesRollup,
+                receipts.values('date').annotate(**totals, max_sale=Max(amount))
+            ),
+            HourlySalesRollup.__name__: build(
+                HourlySalesRollup,
+                receipts.annotate(hour=ExtractHour('created_at')).values('date', 'hour').annotate(**totals)
+            ),
+            DailyProductRollup.__name__: build(
+                DailyProductRollup,
+                receipts.values('date', 'product_name').annotate(
+                    **totals,
+                    price_sum=Sum('selling_price'),
+                    first_sold_at=Min('created_at'),
+                    last_sold_at=Max('created_at'),
+                )
+            ),
+            DailyCustomerRollup.__name__: build(
+                DailyCustomerRollup,
+                receipts.values('date', 'customer_name').annotate(
+                    **totals,
+                    first_purchased_at=Min('created_at'),
+                    last_purchased_at=Max('created_at'),
+                )
+            ),
+            ProductCustomerRollup.__name__: build(
+                ProductCustomerRollup,
+                pair_receipts.annotate(year=ExtractYear('created_at')).values(
+                    'year', 'product_name', 'customer_name'
+                ).annotate(receipt_count=Count('id'))
+            ),
+        }
+
+        # Summaries are folded from the freshly rebuilt per-day product rollups
+        first_year = since.year if since is not None else None
+        stale_summaries = SALE_SUMMARY_FIX.objects.all()
+        if first_year is not None:
+            stale_summaries = stale_summaries.filter(
+                Q(period=SALE_SUMMARY_FIX.ALL_TIME) | Q(period__gte=str(first_year))
+            )
+        stale_summaries.delete()
+        product_rollups = DailyProductRollup.objects.order_by()
+        years = product_rollups.annotate(year=ExtractYear('date')).values_list('year', flat=True).distinct()
+        summaries = list(_summary_rows(product_rollups, SALE_SUMMARY_FIX.ALL_TIME))
+        for year in years:
+            if first_year is None or year >= first_year:
+                summaries.extend(_summary_rows(product_rollups.filter(date__year=year), str(year)))
+        written[SALE_SUMMARY_FIX.__name__] = len(SALE_SUMMARY_FIX.objects.bulk_create(summaries, batch_size=1000))
+
+        # Visit counts and purchase times are reset from the all-time customer rollups. total_spent is
+        # only set for customers missing from LcdCustomers, as older spend may predate the receipts
+        customers = [
+            LcdCustomers(
+                customer_name=row['customer_name'], total_spent=row['spent'], visit_count=row['visits'],
+                total_items=row['items'], first_purchase_at=row['first'], last_purchase_at=row['last'],
+            )
+            for row in DailyCustomerRollup.objects.order_by().values('customer_name').annotate(
+                spent=Sum('gross_sales'), visits=Sum('receipt_count'), items=Sum('quantity'),
+                first=Min('first_purchased_at'), last=Max('last_purchased_at'),
+            )
+        ]
+        written[LcdCustomers.__name__] = len(LcdCustomers.objects.bulk_create(
+            customers, batch_size=1000, update_conflicts=True, unique_fields=['customer_name'],
+            update_fields=['visit_count', 'total_items', 'first_purchase_at', 'last_purchase_at'],
+        ))
+
+    logger.info(f"Rebuilt sales rollups: {written}")
+    return written
@@ -0,0 +1,250 @@
+import asyncio
+import copy
+import logging
+import os
+from datetime import timedelta
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from dotenv import load_dotenv
+
+from Alltechmanagement.models import SHOP2_STOCK_FIX, SearchIndexOutbox
+
+load_dotenv()
+logger = logging.getLogger('django')
+
+# An index is where the documents are stored.
+SEARCH_INDEX_UID = 'Shop2Stock'
+
+OUTBOX_BATCH_SIZE = 200
+# Failed batches are retried with exponential backoff capped at this many seconds
+OUTBOX_MAX_BACKOFF = 300
+# Claimed entries are hidden from other workers for this long while their batch is in flight
+OUTBOX_LEASE_SECONDS = 60
+# Entries still failing after this many attempts are parked instead of retried
+OUTBOX_MAX_ATTEMPTS = 15
+# How long the worker pauses after an unexpected error before it carries on
+OUTBOX_ERROR_PAUSE = 5
+
+
+class SearchIndexClient:
+    """
+    Async Meilisearch index client. Requests share one keep-alive connection pool and
+    large document lists are split into batches, so index writes never block the
+    event loop or open a connection per call.
+    """
+
+    def __init__(self, url, api_key, index_uid=SEARCH_INDEX_UID, max_batch=1000, max_connections=10):
+        self.index_uid = index_uid
+        self.max_batch = max_batch
+        self._client = httpx.AsyncClient(
+            base_url=url,
+            headers={'Authorization': f'Bearer {api_key}'} if api_key else {},
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=60),
+        )
+
+    def using(self, index_uid):
+        """A client for another index sharing this one's connection pool"""
+        other = copy.copy(self)
+        other.index_uid = index_uid
+        return other
+
+    async def _request(self, method, path, index=True, **kwargs):
+        if index:
+            path = f'/indexes/{self.index_uid}{path}'
+        response = await self._client.request(method, path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def _send_batches(self, method, path, items):
+        tasks = []
+        for start in range(0, len(items), self.max_batch):
+            tasks.append(await self._request(method, path, json=items[start:start + self.max_batch]))
+        return tasks
+
+    async def add_documents(self, documents):
+        """Add or replace whole documents"""
+        return await self._send_batches('POST', '/documents', list(documents))
+
+    async def update_documents(self, documents):
+        """Add documents or update the given fields of existing ones"""
+        return await self._send_batches('PUT', '/documents', list(documents))
+
+    async def delete_document(self, document_id):
+        return await self._request('DELETE', f'/documents/{document_id}')
+
+    async def delete_documents(self, document_ids):
+        return await self._send_batches('POST', '/documents/delete-batch', list(document_ids))
+
+    async def get_documents(self, fields=None, batch_size=1000):
+        """Yield every document in the index, one page per request"""
+        params = {'limit': batch_size}
+        if fields:
+            params['fields'] = ','.join(fields)
+        offset = 0
+        while True:
+            page = await self._request('GET', '/documents', params={**params, 'offset': offset})
+            for document in page['results']:
+                yield document
+            offset += len(page['results'])
+            if not page['results'] or offset >= page['total']:
+                return
+
+    async def get_settings(self):
+        return await self._request('GET', '/settings')
+
+    async def update_settings(self, settings):
+        return await self._request('PATCH', '/settings', json=settings)
+
+    async def create(self, primary_key='id'):
+        return await self._request('POST', '/indexes', index=False,
+                                   json={'uid': self.index_uid, 'primaryKey': primary_key})
+
+    async def delete(self):
+        return await self._request('DELETE', '')
+
+    async def swap_with(self, other_uid):
+        return await self._request('POST', '/swap-indexes', index=False,
+                                   json=[{'indexes': [self.index_uid, other_uid]}])
+
+    async def wait_for_task(self, task, timeout=300, poll_interval=0.5):
+        """Wait for an enqueued task to finish and raise if it failed"""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            status = await self._request('GET', f"/tasks/{task['taskUid']}", index=False)
+            if status['status'] == 'succeeded':
+                return status
+            if status['status'] in ('failed', 'canceled'):
+                raise ValueError(f"Search index task {task['taskUid']} {status['status']}: {status.get('error')}")
+            if asyncio.get_running_loop().time() > deadline:
+                raise TimeoutError(f"Search index task {task['taskUid']} did not finish in {timeout}s")
+            await asyncio.sleep(poll_interval)
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+def search_index_client(**kwargs):
+    return SearchIndexClient(os.getenv('MEILISEARCH_URL'), os.getenv('MEILISEARCH_KEY'), **kwargs)
+
+
+def enqueue_index_sync(*product_ids):
+    """Queue products for re-indexing; call inside the transaction that changed them"""
+    SearchIndexOutbox.objects.bulk_create([SearchIndexOutbox(product_id=product_id) for product_id in product_ids])
+
+
+def product_document(product):
+    return {
+        'id': product['id'],
+        'product_name': product['product_name'],
+        'price': int(product['price']),
+        'quantity': product['quantity'],
+    }
+
+
+def _claim_batch(batch_size):
+    """
+    Lease the next batch of outbox entries. Entries for the same product are coalesced
+    into one document built from the current row; products that no longer exist are
+    returned for deletion.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        # skip_locked lets several workers claim batches side by side
+        pending = SearchIndexOutbox.objects.select_for_update(skip_locked=True).filter(available_at__lte=now)
+        batch = list(pending.order_by('id').values_list('product_id', flat=True)[:batch_size])
+        if not batch:
+            return None
+        product_ids = set(batch)
+        entries = list(pending.filter(product_id__in=product_ids).values_list('pk', 'attempts'))
+        SearchIndexOutbox.objects.filter(pk__in=[pk for pk, _ in entries]).update(
+            available_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        )
+
+    documents = [
+        product_document(product)
+        for product in SHOP2_STOCK_FIX.objects.filter(pk__in=product_ids).values(
+            'id', 'product_name', 'price', 'quantity'
+        )
+    ]
+    deleted = sorted(product_ids - {document['id'] for document in documents})
+    entry_ids = [pk for pk, _ in entries]
+    attempts = max(attempts for _, attempts in entries)
+    return entry_ids, documents, deleted, attempts
+
+
+def _finish_batch(entry_ids, attempts, error=None):
+    if error is None:
+        SearchIndexOutbox.objects.filter(pk__in=entry_ids).delete()
+        return
+    attempts += 1
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        SearchIndexOutbox.objects.filter(pk__in=entry_ids).update(
+            attempts=attempts, available_at=None, last_error=str(error)
+        )
+        logger.error(f"Search index sync parked {len(entry_ids)} outbox entries after {attempts} attempts, "
+                     f"last error: {error}")
+        return
+    SearchIndexOutbox.objects.filter(pk__in=entry_ids).update(
+        attempts=attempts,
+        available_at=timezone.now() + timedelta(seconds=min(2 ** attempts, OUTBOX_MAX_BACKOFF)),
+        last_error=str(error)
+    )
+    logger.error(f"Search index sync failed for {len(entry_ids)} outbox entries (attempt {attempts}): {error}")
+
+
+def requeue_parked():
+    """Make parked outbox entries available again with a fresh attempt count. Returns how many."""
+    return SearchIndexOutbox.objects.filter(available_at__isnull=True).update(
+        available_at=timezone.now(), attempts=0
+    )
+
+
+async def drain_outbox(search_index, batch_size=OUTBOX_BATCH_SIZE):
+    """Push one batch of queued products to the search index. Returns the number of outbox entries processed."""
+    claimed = await sync_to_async(_claim_batch)(batch_size)
+    if claimed is None:
+        return 0
+    entry_ids, documents, deleted, attempts = claimed
+    try:
+        if documents:
+            await search_index.update_documents(documents)
+        if deleted:
+            await search_index.delete_documents(deleted)
+    except Exception as e:
+        # Any failure to push counts as an attempt, so a document that can never be sent is parked
+        await sync_to_async(_finish_batch)(entry_ids, attempts, e)
+        return len(entry_ids)
+
+    await sync_to_async(_finish_batch)(entry_ids, attempts)
+    logger.info(f"Synced {len(documents)} products to the search index, removed {len(deleted)}")
+    return len(entry_ids)
+
+
+async def run_outbox_worker(batch_size=OUTBOX_BATCH_SIZE, interval=1.0, once=False):
+    async with search_index_client() as search_index:
+        while True:
+            try:
+                if await drain_outbox(search_index, batch_size):
+                    continue
+            except Exception:
+                if once:
+                    raise
+                # e.g. the database went away; drop a broken connection and keep the worker alive
+                logger.exception("Search index outbox worker error")
+                await sync_to_async(close_old_connections)()
+                await asyncio.sleep(OUTBOX_ERROR_PAUSE)
+                continue
+            if once:
+                return
+            await asyncio.sleep(interval)
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 
 from Alltechmanagement.models import SHOP2_STOCK_FIX, SAVED_TRANSACTIONS2_FIX, LcdCustomers
@@ -10,6 +12,27 @@ class SellSerializer(serializers.Serializer):
     customer_name = serializers.CharField()
 
 
+class CartItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    # Bounded like SAVED_TRANSACTIONS2_FIX.selling_price, so checkout never fails in bulk_create
+    price = serializers.DecimalField(max_digits=7, decimal_places=2, min_value=Decimal('0.01'))
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CartCheckoutSerializer(serializers.Serializer):
+    customer_name = serializers.CharField()
+    items = CartItemSerializer(many=True, allow_empty=False)
+
+
+class BulkCompleteSerializer(serializers.Serializer):
+    transaction_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+class RefundSerializer(serializers.Serializer):
+    # Defaults to the whole transaction
+    quantity = serializers.IntegerField(min_value=1, required=False)
+
+
 class DispatchSerializer(serializers.Serializer):
     product_name = serializers.CharField()
     quantity = serializers.IntegerField()
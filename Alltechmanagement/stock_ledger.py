@@ -0,0 +1,59 @@
+from django.db.models import Q, Sum
+
+from Alltechmanagement.models import StockMovement
+
+
+def movement(product, kind, quantity_change, quantity_after=None):
+    """
+    An unsaved StockMovement for `product`. `quantity_after` defaults to the product's
+    quantity, which must already hold the new level.
+    """
+    return StockMovement(
+        product_id=product.id,
+        product_name=product.product_name,
+        kind=kind,
+        quantity_change=quantity_change,
+        quantity_after=product.quantity if quantity_after is None else quantity_after,
+    )
+
+
+def record_movements(*movements):
+    """Append movements to the ledger; call inside the transaction that changed the stock"""
+    StockMovement.objects.bulk_create([m for m in movements if m.quantity_change])
+
+
+def movement_history(product_id, since=None):
+    """A product's movements, newest first, served by the (product, -created_at) index"""
+    movements = StockMovement.objects.filter(product_id=product_id)
+    if since is not None:
+        movements = movements.filter(created_at__gte=since)
+    return movements.order_by('-created_at', '-id')
+
+
+def movement_summary(product_id, since):
+    """
+    Units sold, refunded, restocked and adjusted since `since`, with the sell-through
+    rate: net units sold over the units available during the period.
+    """
+    movements = StockMovement.objects.filter(product_id=product_id, created_at__gte=since)
+    totals = movements.aggregate(
+        **{
+            kind: Sum('quantity_change', filter=Q(kind=kind))
+            for kind, _ in StockMovement.KIND_CHOICES
+        }
+    )
+    # Sales are stored as negative changes, adjustments keep their sign
+    totals = {kind: value or 0 for kind, value in totals.items()}
+    totals[StockMovement.SALE] = -totals[StockMovement.SALE]
+    first = movements.order_by('created_at', 'id').values('quantity_change', 'quantity_after').first()
+    opening = first['quantity_after'] - first['quantity_change'] if first else 0
+    net_sold = totals[StockMovement.SALE] - totals[StockMovement.REFUND]
+    available = opening + totals[StockMovement.RESTOCK]
+    return {
+        'units_sold': totals[StockMovement.SALE],
+        'units_refunded': totals[StockMovement.REFUND],
+        'units_restocked': totals[StockMovement.RESTOCK],
+        'units_adjusted': totals[StockMovement.ADJUSTMENT],
+        'opening_quantity': opening,
+        'sell_through_rate': round(net_sold / available, 4) if available else None,
+    }
@@ -0,0 +1,257 @@
+import base64
+import copy
+import datetime
+import json
+import logging.config
+import os
+import tempfile
+import threading
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from django.core.cache import cache
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from asgiref.sync import async_to_sync
+
+from Alltechmanagement import rollups, search_sync, views
+from Alltechmanagement.cache_utils import get_version
+from Alltechmanagement.custom_auth import CustomUser
+from Alltechmanagement.customPagination import SavedTransactionsCursorPagination, StockCursorPagination
+from Alltechmanagement.log_handlers import QueuedFileHandler
+from Alltechmanagement.serializers import CartItemSerializer
+from Alltechmanagement.models import (RECEIPTS2_FIX, DailyProductRollup, DailyCustomerRollup, SALE_SUMMARY_FIX,
+                                      SAVED_TRANSACTIONS2_FIX, SHOP2_STOCK_FIX, SearchIndexOutbox)
+
+
+def make_receipts(sales):
+    now = timezone.now()
+    return [
+        RECEIPTS2_FIX(product_name=product, customer_name=customer, selling_price=Decimal('10.00'),
+                      quantity=1, created_at=now)
+        for product, customer in sales
+    ]
+
+
+OVERLAPPING_SALES = [('screen a', 'alice'), ('screen b', 'bob'), ('screen c', 'carol')]
+
+
+class RecordReceiptsLockOrderTests(TestCase):
+    def upserted_rows(self, receipts):
+        with mock.patch.object(rollups, 'upsert_totals', wraps=rollups.upsert_totals) as upsert:
+            rollups.record_receipts(receipts)
+        return [(call.args[0].__name__, sorted(call.args[1].items())) for call in upsert.call_args_list]
+
+    def test_overlapping_batches_in_opposite_orders_upsert_rows_in_the_same_order(self):
+        forward = self.upserted_rows(make_receipts(OVERLAPPING_SALES))
+        backward = self.upserted_rows(make_receipts(reversed(OVERLAPPING_SALES)))
+
+        self.assertEqual(forward, backward)
+        self.assertEqual(DailyProductRollup.objects.get(product_name='screen a').receipt_count, 2)
+        self.assertEqual(
+            SALE_SUMMARY_FIX.objects.get(period=SALE_SUMMARY_FIX.ALL_TIME, product_name='screen c').quantity, 2
+        )
+
+
+class SaleSummaryUpsertTests(TestCase):
+    def test_completions_add_to_the_yearly_and_all_time_rows(self):
+        earlier = make_receipts([('screen a', 'alice')])
+        later = make_receipts([('screen a', 'bob'), ('screen a', 'carol')])
+        for receipt in earlier:
+            receipt.created_at -= datetime.timedelta(minutes=5)
+        rollups.record_receipts(later)
+        rollups.record_receipts(earlier)
+
+        year = str(timezone.localtime(later[0].created_at).year)
+        for period in (year, SALE_SUMMARY_FIX.ALL_TIME):
+            with self.subTest(period=period):
+                summary = SALE_SUMMARY_FIX.objects.get(period=period, product_name='screen a')
+                self.assertEqual((summary.receipt_count, summary.quantity, summary.gross_sales),
+                                 (3, 3, Decimal('30.00')))
+                self.assertEqual((summary.first_sold_at, summary.last_sold_at),
+                                 (earlier[0].created_at, later[0].created_at))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'row-lock deadlocks need Postgres')
+class RecordReceiptsConcurrencyTests(TransactionTestCase):
+    def test_overlapping_batches_in_opposite_orders_complete_concurrently(self):
+        # Seed the rows so both batches take row locks on updates instead of inserting
+        rollups.record_receipts(make_receipts(OVERLAPPING_SALES))
+        start = threading.Event()
+        errors = []
+
+        def complete(sales):
+            try:
+                start.wait(timeout=10)
+                with transaction.atomic():
+                    rollups.record_receipts(make_receipts(sales))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=complete, args=(OVERLAPPING_SALES,)),
+            threading.Thread(target=complete, args=(list(reversed(OVERLAPPING_SALES)),)),
+        ]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(DailyCustomerRollup.objects.get(customer_name='bob').receipt_count, 3)
+
+
+class LoggingConfigTests(SimpleTestCase):
+    def test_settings_logging_configures_and_writes_queued_records(self):
+        config = copy.deepcopy(settings.LOGGING)
+        with tempfile.TemporaryDirectory() as log_dir:
+            for handler in config['handlers'].values():
+                if 'filename' in handler:
+                    handler['filename'] = os.path.join(log_dir, handler['filename'])
+            try:
+                logging.config.dictConfig(config)
+                logger = logging.getLogger('scheduler')
+                logger.info('queued %s', 'record')
+                for handler in logger.handlers:
+                    if isinstance(handler, QueuedFileHandler):
+                        handler.close()
+                with open(os.path.join(log_dir, 'scheduler.log')) as log_file:
+                    self.assertIn('queued record', log_file.read())
+            finally:
+                logging.config.dictConfig(settings.LOGGING)
+
+
+def cursor_request(cursor):
+    return Request(APIRequestFactory().get('/', {'cursor': cursor}))
+
+
+def encode_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class KeysetPaginationCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        SHOP2_STOCK_FIX.objects.bulk_create(
+            SHOP2_STOCK_FIX(product_name=f'screen {i}', quantity=i, price=Decimal('10.00')) for i in range(3)
+        )
+
+    def test_next_cursor_seeks_past_the_page(self):
+        paginator = StockCursorPagination()
+        paginator.page_size = 2
+        first = paginator.paginate_queryset(SHOP2_STOCK_FIX.objects.all(), cursor_request(''))
+        rest = paginator.paginate_queryset(SHOP2_STOCK_FIX.objects.all(), cursor_request(paginator.next_cursor))
+        self.assertEqual([row.product_name for row in first + rest], ['screen 0', 'screen 1', 'screen 2'])
+
+    def test_tampered_cursors_are_not_found(self):
+        tampered = [
+            'not base64!',
+            encode_cursor({'p': ['abc'], 'r': False}),
+            encode_cursor({'p': [1, 2], 'r': False}),
+            encode_cursor({'p': [None], 'r': False}),
+            encode_cursor({'p': [1], 'r': 'no'}),
+            encode_cursor(['p', 'r']),
+        ]
+        for cursor in tampered:
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                StockCursorPagination().paginate_queryset(SHOP2_STOCK_FIX.objects.all(), cursor_request(cursor))
+
+    def test_tampered_datetime_cursor_is_not_found(self):
+        cursor = encode_cursor({'p': ['yesterday', 1], 'r': False})
+        with self.assertRaises(NotFound):
+            SavedTransactionsCursorPagination().paginate_queryset(SAVED_TRANSACTIONS2_FIX.objects.all(),
+                                                                  cursor_request(cursor))
+
+
+class CartItemSerializerTests(SimpleTestCase):
+    def test_price_is_bounded_like_the_saved_transaction_column(self):
+        for price, valid in (('99999.99', True), ('0.01', True), ('100000.00', False), ('0.00', False),
+                             ('-5.00', False), ('1.001', False)):
+            with self.subTest(price=price):
+                serializer = CartItemSerializer(data={'product_id': 1, 'price': price, 'quantity': 1})
+                self.assertEqual(serializer.is_valid(), valid)
+
+
+class RejectingSearchIndex:
+    async def update_documents(self, documents):
+        raise TypeError('Object of type Decimal is not JSON serializable')
+
+    async def delete_documents(self, document_ids):
+        raise TypeError('unreachable')
+
+
+class OutboxRetryTests(TestCase):
+    def test_entry_is_parked_after_max_attempts_and_can_be_requeued(self):
+        product = SHOP2_STOCK_FIX.objects.create(product_name='screen a', quantity=1, price=Decimal('10.00'))
+        search_sync.enqueue_index_sync(product.id)
+        drain = async_to_sync(search_sync.drain_outbox)
+
+        with self.assertLogs('django', level='ERROR') as logs:
+            for _ in range(search_sync.OUTBOX_MAX_ATTEMPTS):
+                SearchIndexOutbox.objects.exclude(available_at=None).update(available_at=timezone.now())
+                self.assertEqual(drain(RejectingSearchIndex()), 1)
+        self.assertIn('parked 1 outbox entries', logs.output[-1])
+
+        entry = SearchIndexOutbox.objects.get()
+        self.assertIsNone(entry.available_at)
+        self.assertEqual(entry.attempts, search_sync.OUTBOX_MAX_ATTEMPTS)
+        self.assertIn('not JSON serializable', entry.last_error)
+        self.assertEqual(drain(RejectingSearchIndex()), 0)
+
+        self.assertEqual(search_sync.requeue_parked(), 1)
+        self.assertEqual(SearchIndexOutbox.objects.get().attempts, 0)
+
+
+class StockPageCacheKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        SHOP2_STOCK_FIX.objects.bulk_create(
+            SHOP2_STOCK_FIX(product_name=f'screen {i}', quantity=i, price=Decimal('10.00')) for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def cache_keys(self, requests):
+        """Status codes of `requests` to get_shop2_stock, and the page cache keys they used"""
+        statuses = []
+        with mock.patch.object(views, 'get_or_compute', wraps=views.get_or_compute) as get_or_compute:
+            for params in requests:
+                request = APIRequestFactory().get('/api/get_shop2_stock', params)
+                force_authenticate(request, user=CustomUser(firebase_uid='stock-page-test', is_authenticated=True))
+                statuses.append(views.get_shop2_stock(request).status_code)
+        return statuses, [call.args[0] for call in get_or_compute.call_args_list]
+
+    def test_rejected_pages_and_cursors_are_not_cached(self):
+        statuses, keys = self.cache_keys([
+            {'page': '999999x'}, {'page': '0'}, {'cursor': 'not a cursor'},
+            {'cursor': encode_cursor({'p': ['abc'], 'r': False})}, {'page': '2'},
+        ])
+        self.assertEqual(statuses, [404] * 5)
+        # Only the well-formed page past the end gets as far as computing, which stores nothing
+        self.assertEqual(keys, [f'SHOP_STOCK_PAGE_{get_version("SHOP_STOCK")}_2'])
+        self.assertIsNone(cache.get(keys[0]))
+
+    def test_equivalent_pages_share_one_entry(self):
+        statuses, keys = self.cache_keys([{}, {'page': '1'}, {'page': '01'}, {'page': 'last'}])
+        self.assertEqual(statuses, [200] * 4)
+        self.assertEqual(len(set(keys)), 1)
+
+        # Two encodings of the same cursor position
+        first_id = SHOP2_STOCK_FIX.objects.order_by('id').values_list('id', flat=True)[0]
+        compact = base64.urlsafe_b64encode(json.dumps({'p': [first_id], 'r': False}, separators=(',', ':')).encode())
+        statuses, keys = self.cache_keys([{'cursor': encode_cursor({'p': [first_id], 'r': False})},
+                                          {'cursor': compact.decode()}])
+        self.assertEqual(statuses, [200] * 2)
+        self.assertEqual(len(set(keys)), 1)
@@ -1,12 +1,91 @@
 import logging
+from django.core.cache import cache
 from rest_framework.throttling import UserRateThrottle, AnonRateThrottle, SimpleRateThrottle
 
 from djangoProject15 import settings
 
-logger = logging.getLogger('django.security')
-
+# Sampled in LOGGING: these fire on every throttled request, so messages carry no per-client detail
+logger = logging.getLogger('django.security.throttles')
+
+# Sliding-window counter: one counter per fixed window, with the previous window's count
+# weighted by how much of it still overlaps the sliding window. Checked and incremented
+# atomically, so concurrent workers can never both take the last slot.
+SLIDING_WINDOW_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+if previous * tonumber(ARGV[1]) + current >= tonumber(ARGV[2]) then
+    return {0, current, previous}
+end
+current = redis.call('INCR', KEYS[1])
+if current == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[3])
+end
+return {1, current, previous}
+"""
+
+_sliding_window = None
+
+
+def _sliding_window_script():
+    """The registered Lua script, or None when the cache is not Redis (local development)"""
+    global _sliding_window
+    if _sliding_window is None:
+        try:
+            from django_redis import get_redis_connection
+            _sliding_window = get_redis_connection('default').register_script(SLIDING_WINDOW_SCRIPT)
+        except NotImplementedError:
+            _sliding_window = False
+    return _sliding_window or None
+
+
+class RedisSlidingWindowThrottle(SimpleRateThrottle):
+    """
+    Drop-in SimpleRateThrottle base that keeps two integer counters per client in Redis
+    and checks them with one Lua call, instead of reading, trimming and writing back a
+    list of request timestamps. Falls back to the stock history list without Redis.
+    """
+    window = None
 
-class FirebaseUserRateThrottle(UserRateThrottle):
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        script = _sliding_window_script()
+        if script is None:
+            return super().allow_request(request, view)
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window_start = self.now - self.now % self.duration
+        weight = 1 - (self.now - window_start) / self.duration
+        allowed, current, previous = script(
+            keys=[cache.make_key(f'{self.key}:{int(window_start)}'),
+                  cache.make_key(f'{self.key}:{int(window_start - self.duration)}')],
+            args=[repr(weight), self.num_requests, self.duration * 2 * 1000],
+        )
+        self.window = (window_start, weight, current, previous)
+        return True if allowed else self.throttle_failure()
+
+    def throttle_failure(self):
+        logger.warning('Rate limit exceeded for %s', self.scope)
+        return False
+
+    def wait(self):
+        if self.window is None:
+            return super().wait()
+        window_start, weight, current, previous = self.window
+        remaining = self.duration - (self.now - window_start)
+        if current >= self.num_requests or not previous:
+            # Nothing frees up before this window ends
+            return remaining
+        # Time until the previous window's weighted share drops enough to admit one more
+        allowed_weight = (self.num_requests - current) / previous
+        return max((weight - allowed_weight) * self.duration, 0)
+
+
+class FirebaseUserRateThrottle(RedisSlidingWindowThrottle, UserRateThrottle):
     """
     Custom UserRateThrottle that uses firebase_uid as the unique identifier for rate limiting.
     Includes additional logging for security monitoring.
@@ -15,14 +94,13 @@ class FirebaseUserRateThrottle(UserRateThrottle):
     def get_cache_key(self, request, view):
         if request.user and request.user.is_authenticated and hasattr(request.user, 'firebase_uid'):
             ident = request.user.firebase_uid
-            logger.info(f'Rate limiting for Firebase user: {ident}')
             return self.cache_format % {
                 'scope': self.scope,
                 'ident': ident
             }
         logger.warning('Unauthenticated request or missing firebase_uid')
         return super().get_cache_key(request, view)
-class ClerkUserRateThrottle(UserRateThrottle):
+class ClerkUserRateThrottle(RedisSlidingWindowThrottle, UserRateThrottle):
     """
     Custom UserRateThrottle that uses clerk.data.id as the unique identifier for rate limiting.
     Includes additional logging for security monitoring.
@@ -31,7 +109,6 @@ class ClerkUserRateThrottle(UserRateThrottle):
     def get_cache_key(self, request, view):
         if request.user and request.user.is_authenticated and hasattr(request.user, 'data'):
             ident = request.user.data.id
-            logger.info(f'Rate limiting for Clerk user: {ident}')
             return self.cache_format % {
                 'scope': self.scope,
                 'ident': ident
@@ -65,7 +142,6 @@ class BaseFirebaseThrottle(FirebaseUserRateThrottle):
             }
 
         ident = request.user.firebase_uid
-        logger.info(f'Rate limiting for Firebase user: {ident}')
         return self.cache_format % {
             'scope': self.scope,
             'ident': ident
@@ -99,14 +175,13 @@ class BaseClerkThrottle(ClerkUserRateThrottle):
             }
 
         ident = request.user.data.id
-        logger.info(f'Rate limiting for Clerk user: {ident}')
         return self.cache_format % {
             'scope': self.scope,
             'ident': ident
         }
 
 
-class POSAuthThrottle(AnonRateThrottle):
+class POSAuthThrottle(RedisSlidingWindowThrottle, AnonRateThrottle):
     """
     Strict throttling for login attempts and auth-related endpoints
     5 attempts per minute - prevents brute force while allowing retries
@@ -3,7 +3,7 @@ from . import views
 from django.conf.urls import handler404, handler500
 
 from .admin_apis import main_dashboard, weekly_analysis, monthly_analysis, yearly_analysis, customer_insights, \
-    product_insights, sales_patterns
+    product_insights, sales_patterns, stock_movements
 from .celery_auth_api import CeleryAuthTokenView
 from .firebase_auth import FirebaseAuthTokenView
 from .refresh_token_view import RefreshTokenView
@@ -16,9 +16,13 @@ urlpatterns = [
     path('api/get_shop2_stock', views.get_shop2_stock, name='get_shop2_stock_api'),
     path('api/refresh-token/',RefreshTokenView.as_view(), name='refresh-token'),
     path('api/get_shop2_stock_api/<int:id>', views.get_shop2_stock_api, name='get_shop2_stock_api'),
+    path('api/search_stock', views.search_stock, name='search_stock'),
+    path('api/fuzzy_search', views.fuzzy_search, name='fuzzy_search'),
     path('api/sell2/<int:product_id>', views.sell_api, name='sell2api'),
+    path('api/checkout2', views.checkout_cart_api, name='checkout_cart_api'),
     path('api/saved2', views.get_saved2, name='saved_api2'),
     path('api/complete2/<int:transaction_id>', views.complete_transaction2_api, name='complete_transaction2_api'),
+    path('api/complete2/bulk', views.bulk_complete_transactions2_api, name='bulk_complete_transactions2_api'),
     path('api/add_stock2', views.add_stock2_api, name='add_stock2_api'),
     path('api/delete_stock2_api/<int:id>', views.delete_stock2_api, name='delete_stock2_api'),
     path('api/update_stock2/<int:id>', views.update_stock2_api, name='update_stock2_api'),
@@ -34,6 +38,7 @@ urlpatterns = [
     path('api/customers-insights/', customer_insights, name='customer-insights'),
     path('api/products-insights/', product_insights, name='product-insights'),
     path('api/patterns/', sales_patterns, name='sales-patterns'),
+    path('api/stock-movements/<int:product_id>/', stock_movements, name='stock-movements'),
     path('api/daily-ai/', views.get_daily_ai_insights, name='sales-patterns'),
     path('api/weekly-ai/', views.get_weekly_ai_insights, name='sales-patterns'),
 ]
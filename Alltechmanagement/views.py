@@ -1,5 +1,7 @@
 import base64
+import json
 import os
+from collections import defaultdict
 from datetime import datetime, timedelta
 from functools import wraps
 from io import BytesIO
@@ -15,45 +17,75 @@ import asyncio
 import time
 from django.template.loader import render_to_string
 from django.db import transaction as django_transaction
-from django.db.models import Sum, F
+from django.db.models import Case, F, IntegerField, Sum, Value, When
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.relations import RelatedField
 from rest_framework.response import Response
 from Alltechmanagement.FCMManager import get_ref
 from Alltechmanagement.GPTAgent import run_conversation
-from Alltechmanagement.admin_apis import invalidate_dashboard_caches
+from Alltechmanagement.admin_apis import apply_sales_to_dashboard_caches
+from Alltechmanagement.cache_utils import get_or_compute, get_version
 from Alltechmanagement.celery_jwt import CeleryJWTAuthentication
-from Alltechmanagement.customPagination import CustomPagination, StandardResultsSetPagination
+from Alltechmanagement.customPagination import CustomPagination, StandardResultsSetPagination, \
+    StockCursorPagination, LowStockCursorPagination, SavedTransactionsCursorPagination, wants_cursor_pagination
 from Alltechmanagement.models import SHOP2_STOCK_FIX, \
     SAVED_TRANSACTIONS2_FIX, \
-    COMPLETED_TRANSACTIONS2_FIX, RECEIPTS2_FIX, LcdCustomers
+    COMPLETED_TRANSACTIONS2_FIX, RECEIPTS2_FIX, LcdCustomers, StockMovement
+from Alltechmanagement.rollups import record_receipts, customer_totals, upsert_customer_totals
+from Alltechmanagement.product_search import product_search_index, stock_changed
+from Alltechmanagement.refunds import refund_saved_transaction
+from Alltechmanagement.search_sync import enqueue_index_sync
+from Alltechmanagement.stock_ledger import movement, record_movements
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.views.decorators.csrf import csrf_exempt
+from django.core.handlers.asgi import ASGIRequest
 from Alltechmanagement.serializers import SellSerializer, shop2_serializer, \
-    saved_serializer2, LcdCustomerSerializer
+    saved_serializer2, LcdCustomerSerializer, CartCheckoutSerializer, BulkCompleteSerializer, RefundSerializer
 from Alltechmanagement.throttles import InventoryCheckThrottle, SalesOperationsThrottle, InventoryModificationThrottle, \
     OrderManagementThrottle, WeeklyEmailAPIThrottle
-import meilisearch
 import logging
 from xhtml2pdf import pisa
 load_dotenv()
 ref = get_ref()
-client = meilisearch.Client(os.getenv('MEILISEARCH_URL'), os.getenv('MEILISEARCH_KEY'))
-
-# An index is where the documents are stored.
-index = client.index('Shop2Stock')
-
 logger = logging.getLogger('django')
 
 
 #Custom Decorator for async api views
 def async_api_view(methods):
+    """
+    Serve an async view natively on the running event loop. The DRF view built by
+    api_view is only used for its request handling: authentication, permission and
+    throttle checks (which hit the DB and cache) run in a worker thread, the view
+    itself is awaited, and Django renders the DRF Response as usual.
+    """
     def decorator(func):
-        @api_view(methods)
-        @permission_classes([IsAuthenticated])
+        func.permission_classes = [IsAuthenticated]
+        view_class = api_view(methods)(func).cls
+
+        @csrf_exempt
         @wraps(func)
-        def wrapper(request, *args, **kwargs):
-            return asyncio.run(func(request, *args, **kwargs))
+        async def wrapper(request, *args, **kwargs):
+            view = view_class()
+            view.args, view.kwargs = args, kwargs
+            request = view.initialize_request(request, *args, **kwargs)
+            view.request = request
+            view.headers = view.default_response_headers
+            try:
+                await sync_to_async(view.initial)(request, *args, **kwargs)
+                method = request.method.lower()
+                if method not in view.http_method_names:
+                    view.http_method_not_allowed(request)
+                if method == 'options':
+                    response = view.options(request, *args, **kwargs)
+                else:
+                    response = await func(request, *args, **kwargs)
+            except Exception as exc:
+                response = view.handle_exception(exc)
+            view.response = view.finalize_response(request, response, *args, **kwargs)
+            return view.response
 
         return wrapper
 
@@ -90,16 +122,19 @@ def log_db_queries(f):
 @permission_classes([IsAuthenticated])
 @throttle_classes([InventoryCheckThrottle])
 def get_shop2_stock(request):
-    cache_key = 'SHOP_STOCK'
-    cached_data = cache.get(cache_key)
-    if cached_data is None:
-        cached_data = SHOP2_STOCK_FIX.objects.all()
-        cache.set(cache_key, cached_data, timeout=60 * 120)
-    pagination_class = CustomPagination
-    paginator = pagination_class()
-    paginated_queryset = paginator.paginate_queryset(cached_data, request)
-    serializer = shop2_serializer(paginated_queryset, many=True)
-    return paginator.get_paginated_response(serializer.data)
+    paginator = StockCursorPagination() if wants_cursor_pagination(request) else CustomPagination()
+    queryset = SHOP2_STOCK_FIX.objects.order_by('id')
+    # Pages are cached already serialized under the current stock version, so a hit
+    # is a plain cache read; stock writes bump the version instead of deleting keys.
+    # The key holds the validated page, so malformed page numbers or cursors are
+    # rejected before they can add cache entries
+    cache_key = f'SHOP_STOCK_PAGE_{get_version("SHOP_STOCK")}_{paginator.page_cache_key(queryset, request)}'
+    cached_page = get_or_compute(
+        cache_key,
+        lambda: paginator.serialize_page(queryset, request, shop2_serializer),
+        fresh_for=60 * 120, keep_for=60 * 120
+    )
+    return paginator.get_cached_page_response(request, cached_page)
 
 
 @api_view(['GET'])
@@ -116,6 +151,46 @@ def get_shop2_stock_api(request, id):
     return Response({'data': cached_data})
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([InventoryCheckThrottle])
+def search_stock(request):
+    # Served from this worker's in-process index, so lookups keep working without the search service
+    query = request.query_params.get('q', '')
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    return Response({'query': query, 'results': product_search_index.search(query, limit)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([InventoryCheckThrottle])
+def fuzzy_search(request):
+    # Database backed, typo tolerant search over stock or receipts using the pg_trgm indexes
+    query = request.query_params.get('q', '').strip()
+    scope = request.query_params.get('scope', 'stock')
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        limit = 20
+    if not query:
+        return Response({'query': query, 'results': []})
+
+    if scope == 'receipts':
+        results = RECEIPTS2_FIX.objects.name_search(query).order_by('-similarity', '-created_at').values(
+            'id', 'product_name', 'selling_price', 'quantity', 'customer_name', 'created_at', 'similarity'
+        )[:limit]
+    elif scope == 'stock':
+        results = SHOP2_STOCK_FIX.objects.name_search(query).values(
+            'id', 'product_name', 'price', 'quantity', 'similarity'
+        )[:limit]
+    else:
+        return Response({'error': "scope must be 'stock' or 'receipts'"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'query': query, 'results': list(results)})
+
+
 @async_api_view(['POST'])
 @throttle_classes([SalesOperationsThrottle])
 async def sell_api(request, product_id):
@@ -144,9 +219,12 @@ async def sell_api(request, product_id):
                 product.quantity = F('quantity') - quantity
                 product.save()
 
+                enqueue_index_sync(product_id)
+
                 # Create saved transaction
                 saved_transaction = SAVED_TRANSACTIONS2_FIX.objects.create(
                     product_name=serializer.validated_data['product_name'],
+                    product=product,
                     selling_price=serializer.validated_data['price'],
                     quantity=quantity,
                     customer_name=serializer.validated_data['customer_name']
@@ -154,6 +232,7 @@ async def sell_api(request, product_id):
 
                 # Refresh product to get actual quantity
                 product.refresh_from_db()
+                record_movements(movement(product, StockMovement.SALE, -quantity))
 
                 return product, saved_transaction
 
@@ -173,25 +252,11 @@ async def sell_api(request, product_id):
             'transaction_id': saved_transaction.id
         }
 
-        # Handle non-critical async operations
+        # Handle non-critical async operations, the search index is synced by the outbox worker
         async def async_operations():
-            try:
-                # Update search index
-                body = {
-                    'id': product_id,
-                    'product_name': serializer.validated_data['product_name'],
-                    'price': int(serializer.validated_data['price']),
-                    'quantity': product.quantity,
-                }
-
-                response = index.update_documents([body])
-                logger.info(response)
-            except Exception as e:
-                print(f"Error updating index: {e}")
-
             # Clear cache using async cache operations
             await cache.adelete(f'SHOP_STOCK_{product_id}')
-            await cache.adelete('SHOP_STOCK')
+            await stock_changed(products=[product])
 
         # Create background task for async operations
 
@@ -212,10 +277,143 @@ async def sell_api(request, product_id):
         )
 
 
+@async_api_view(['POST'])
+@throttle_classes([SalesOperationsThrottle])
+async def checkout_cart_api(request):
+    serializer = CartCheckoutSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+
+    items = serializer.validated_data['items']
+    customer_name = serializer.validated_data['customer_name']
+    # The same product may appear on several lines, stock is checked against the total
+    wanted = defaultdict(int)
+    for item in items:
+        wanted[item['product_id']] += item['quantity']
+
+    @sync_to_async
+    def perform_db_operations():
+        with django_transaction.atomic():
+            # Lock every product in one statement, in id order so concurrent carts cannot deadlock
+            products = {
+                product.id: product
+                for product in SHOP2_STOCK_FIX.objects.select_for_update().filter(pk__in=wanted).order_by('id')
+            }
+            missing = [product_id for product_id in wanted if product_id not in products]
+            if missing:
+                raise SHOP2_STOCK_FIX.DoesNotExist(f'Products not found: {missing}')
+            short = [products[product_id].product_name for product_id, quantity in wanted.items()
+                     if products[product_id].quantity < quantity]
+            if short:
+                raise ValueError(f'Insufficient stock for {", ".join(short)}')
+
+            SHOP2_STOCK_FIX.objects.filter(pk__in=wanted).update(
+                quantity=F('quantity') - Case(
+                    *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in wanted.items()],
+                    output_field=IntegerField()
+                )
+            )
+            for product_id, quantity in wanted.items():
+                products[product_id].quantity -= quantity
+            enqueue_index_sync(*products)
+            record_movements(*[
+                movement(products[product_id], StockMovement.SALE, -quantity)
+                for product_id, quantity in wanted.items()
+            ])
+
+            saved_transactions = SAVED_TRANSACTIONS2_FIX.objects.bulk_create([
+                SAVED_TRANSACTIONS2_FIX(
+                    product_name=products[item['product_id']].product_name,
+                    product=products[item['product_id']],
+                    selling_price=item['price'],
+                    quantity=item['quantity'],
+                    customer_name=customer_name
+                )
+                for item in items
+            ])
+            return products, saved_transactions
+
+    try:
+        products, saved_transactions = await perform_db_operations()
+    except SHOP2_STOCK_FIX.DoesNotExist as e:
+        logging.error("Cart checkout failed: %s", str(e))
+        return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError as e:
+        logging.error("A value error occurred: %s", str(e))
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logging.error("An error occurred: %s", str(e))
+        return Response(
+            {'error': 'An internal error has occurred!'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    # One cache invalidation for the whole cart, the outbox worker syncs the search index
+    async def async_operations():
+        await cache.adelete_many([f'SHOP_STOCK_{product_id}' for product_id in products])
+        await stock_changed(products=products.values())
+
+    await asyncio.create_task(async_operations())
+
+    return Response({
+        'data': serializer.data,
+        'transaction_ids': [saved_transaction.id for saved_transaction in saved_transactions]
+    }, status=status.HTTP_200_OK)
+
+
+def _saved_transaction_stream():
+    """Queryset of saved transactions, newest first, and a row -> NDJSON line encoder"""
+    fields = saved_serializer2().fields
+
+    def represent(name, value):
+        # values() already gives related fields as their primary key
+        if value is None or isinstance(fields[name], RelatedField):
+            return value
+        return fields[name].to_representation(value)
+
+    def encode(row):
+        return json.dumps({name: represent(name, value) for name, value in row.items()}) + '\n'
+
+    return SAVED_TRANSACTIONS2_FIX.objects.order_by('-created_at', '-id').values(*fields), encode
+
+
+def stream_saved_transactions():
+    """
+    Saved transactions as newline-delimited JSON, newest first. Rows come from a DB
+    iterator and are written one at a time, so memory stays flat however long the
+    backlog is. Values are formatted by the serializer fields to match get_saved2.
+    """
+    rows, encode = _saved_transaction_stream()
+    for row in rows.iterator(chunk_size=500):
+        yield encode(row)
+
+
+async def astream_saved_transactions():
+    """
+    The same stream for ASGI. StreamingHttpResponse drains a sync iterator into a list
+    before sending under ASGI, so the rows must come from an async iterator there.
+    """
+    rows, encode = _saved_transaction_stream()
+    async for row in rows.aiterator(chunk_size=500):
+        yield encode(row)
+
+
 @api_view(['GET'])
 @throttle_classes([InventoryCheckThrottle])
 @permission_classes([IsAuthenticated])
 def get_saved2(request):
+    if request.query_params.get('stream') == 'ndjson':
+        stream = astream_saved_transactions() if isinstance(request._request, ASGIRequest) \
+            else stream_saved_transactions()
+        return StreamingHttpResponse(stream, content_type='application/x-ndjson')
+    if wants_cursor_pagination(request):
+        paginator = SavedTransactionsCursorPagination()
+        page = paginator.paginate_queryset(SAVED_TRANSACTIONS2_FIX.objects.all(), request)
+        return paginator.get_paginated_response(saved_serializer2(page, many=True).data)
+    if request.query_params.get('pagination') == 'page':
+        paginator = StandardResultsSetPagination()
+        page = paginator.paginate_queryset(SAVED_TRANSACTIONS2_FIX.objects.order_by('-created_at', '-id'), request)
+        return paginator.get_paginated_response(saved_serializer2(page, many=True).data)
     data = SAVED_TRANSACTIONS2_FIX.objects.order_by('-created_at')
     serializer = saved_serializer2(instance=data, many=True)
     return Response({'data': serializer.data})
@@ -232,19 +430,11 @@ def complete_transaction2_api(request, transaction_id):
         transaction_quantity = transaction.quantity
         transaction_price = transaction.selling_price
         transaction_customer = transaction.customer_name.lower()
+        transaction.customer_name = transaction_customer
+        completed_at = timezone.now()
 
-        try:
-            # Try to get the customer
-            customer = LcdCustomers.objects.get(customer_name=transaction_customer)
-            # Update the customer's total spent
-            customer.total_spent += transaction_price * transaction_quantity
-            customer.save()
-        except ObjectDoesNotExist:
-            # Customer not found, create a new customer entry
-            LcdCustomers.objects.create(
-                customer_name=transaction_customer,
-                total_spent=transaction_price * transaction_quantity
-            )
+        # Single atomic upsert of the customer's spend, visits and last purchase
+        customer_ids = upsert_customer_totals(customer_totals([transaction], completed_at))
 
         # Create the completed transaction and receipt
         COMPLETED_TRANSACTIONS2_FIX.objects.create(
@@ -253,18 +443,76 @@ def complete_transaction2_api(request, transaction_id):
             quantity=transaction_quantity,
             customer_name=transaction_customer
         )
-        RECEIPTS2_FIX.objects.create(
+        receipt = RECEIPTS2_FIX.objects.create(
             product_name=transaction_name,
+            product_id=transaction.product_id,
+            customer_id=customer_ids[transaction_customer],
             selling_price=transaction_price,
             quantity=transaction_quantity,
-            customer_name=transaction_customer
+            customer_name=transaction_customer,
+            created_at=completed_at
         )
-        # Clear dashboard caches
-        invalidate_dashboard_caches()
+        record_receipts([receipt])
+        # Fold the sale into the cached dashboards once it is committed
+        django_transaction.on_commit(lambda: apply_sales_to_dashboard_caches([receipt]))
         # Delete the saved transaction
         transaction.delete()
 
         return Response('Completed transaction', status=200)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([SalesOperationsThrottle])
+def bulk_complete_transactions2_api(request):
+    serializer = BulkCompleteSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
+    transaction_ids = set(serializer.validated_data['transaction_ids'])
+
+    with django_transaction.atomic():
+        transactions = list(
+            SAVED_TRANSACTIONS2_FIX.objects.select_for_update().filter(pk__in=transaction_ids).order_by('id')
+        )
+        missing = transaction_ids - {transaction.id for transaction in transactions}
+        if missing:
+            return Response({'error': f'Transactions not found: {sorted(missing)}'}, status=404)
+
+        # One upsert statement for every customer in the batch
+        for transaction in transactions:
+            transaction.customer_name = transaction.customer_name.lower()
+        completed_at = timezone.now()
+        customer_ids = upsert_customer_totals(customer_totals(transactions, completed_at))
+
+        COMPLETED_TRANSACTIONS2_FIX.objects.bulk_create([
+            COMPLETED_TRANSACTIONS2_FIX(
+                product_name=transaction.product_name,
+                selling_price=transaction.selling_price,
+                quantity=transaction.quantity,
+                customer_name=transaction.customer_name
+            )
+            for transaction in transactions
+        ])
+        receipts = RECEIPTS2_FIX.objects.bulk_create([
+            RECEIPTS2_FIX(
+                product_name=transaction.product_name,
+                product_id=transaction.product_id,
+                customer_id=customer_ids[transaction.customer_name],
+                selling_price=transaction.selling_price,
+                quantity=transaction.quantity,
+                customer_name=transaction.customer_name,
+                created_at=completed_at
+            )
+            for transaction in transactions
+        ])
+        record_receipts(receipts)
+        # Patch the cached dashboards once for the whole batch
+        django_transaction.on_commit(lambda: apply_sales_to_dashboard_caches(receipts))
+        SAVED_TRANSACTIONS2_FIX.objects.filter(pk__in=transaction_ids).delete()
+
+    return Response({'completed': len(receipts)}, status=200)
+
+
 @async_api_view(['POST'])
 @throttle_classes([InventoryModificationThrottle])
 async def add_stock2_api(request):
@@ -277,6 +525,8 @@ async def add_stock2_api(request):
             if serializer.is_valid(raise_exception=True):
                 with django_transaction.atomic():
                     instance = serializer.save()
+                    enqueue_index_sync(instance.id)
+                    record_movements(movement(instance, StockMovement.RESTOCK, instance.quantity))
                     return instance, serializer.data
             return None, None
 
@@ -285,20 +535,10 @@ async def add_stock2_api(request):
             if not instance:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            # Prepare index data
-            body = {
-                'id': serializer_data['id'],
-                'product_name': serializer_data['product_name'],
-                'price': serializer_data['price'],
-                'quantity': serializer_data['quantity'],
-            }
-
             # Handle non-critical operations
             async def async_operations():
                 try:
-                    result = index.add_documents(body)
-                    logger.info(result)
-                    await cache.adelete('SHOP_STOCK')
+                    await stock_changed(products=[instance])
                 except Exception as e:
                     print(f"Error in async operations: {e}")
 
@@ -334,7 +574,9 @@ async def delete_stock2_api(request, id):
                     'price': data.price,
                     'quantity': data.quantity
                 }
+                record_movements(movement(data, StockMovement.ADJUSTMENT, -data.quantity, quantity_after=0))
                 data.delete()
+                enqueue_index_sync(id)
                 return data_copy
 
         # Delete from database
@@ -343,9 +585,8 @@ async def delete_stock2_api(request, id):
         # Handle non-critical operations
         async def async_operations():
             try:
-                index.delete_document(id)
                 await cache.adelete(f'SHOP_STOCK_{id}')
-                await cache.adelete('SHOP_STOCK')
+                await stock_changed(deleted_ids=[id])
             except Exception as e:
                 print(f"Error in async operations: {e}")
 
@@ -364,11 +605,17 @@ async def update_stock2_api(request, id):
     @sync_to_async
     def validate_and_update():
         try:
-            data = SHOP2_STOCK_FIX.objects.get(pk=id)
-            serializer = shop2_serializer(instance=data, data=request.data, partial=True)
-            if serializer.is_valid(raise_exception=True):
-                with django_transaction.atomic():
+            with django_transaction.atomic():
+                # Locked so the recorded movement matches the quantity actually replaced
+                data = SHOP2_STOCK_FIX.objects.select_for_update().get(pk=id)
+                previous_quantity = data.quantity
+                serializer = shop2_serializer(instance=data, data=request.data, partial=True)
+                if serializer.is_valid(raise_exception=True):
                     instance = serializer.save()
+                    enqueue_index_sync(instance.id)
+                    change = instance.quantity - previous_quantity
+                    kind = StockMovement.RESTOCK if change > 0 else StockMovement.ADJUSTMENT
+                    record_movements(movement(instance, kind, change))
                     return instance, serializer.data
             return None, None
         except SHOP2_STOCK_FIX.DoesNotExist:
@@ -385,15 +632,8 @@ async def update_stock2_api(request, id):
         # Handle non-critical operations
         async def async_operations():
             try:
-                body = {
-                    'id': id,
-                    'product_name': serializer_data['product_name'],
-                    'price': serializer_data['price'],
-                    'quantity': serializer_data['quantity'],
-                }
-                index.update_documents([body])
                 await cache.adelete(f'SHOP_STOCK_{id}')
-                await cache.adelete('SHOP_STOCK')
+                await stock_changed(products=[instance])
             except Exception as e:
                 print(f"Error in async operations: {e}")
 
@@ -410,59 +650,40 @@ async def update_stock2_api(request, id):
         )
 
 
-@async_api_view(['GET'])
+# POST only: a refund restocks, writes the ledger and removes the sale, which a
+# prefetched or retried GET must never trigger
+@async_api_view(['POST'])
 @throttle_classes([OrderManagementThrottle])
 async def refund2_api(request, id):
-    @sync_to_async
-    def process_refund():
-        try:
-            with django_transaction.atomic():
-                transaction = SAVED_TRANSACTIONS2_FIX.objects.get(pk=id)
-                item = SHOP2_STOCK_FIX.objects.filter(
-                    product_name__iexact=transaction.product_name
-                ).first()
-
-                if not item:
-                    return None, 'Item not found in stock'
-
-                item.quantity += 1
-                item.save()
-                transaction.delete()
-                return item, None
-        except SAVED_TRANSACTIONS2_FIX.DoesNotExist:
-            return None, 'Transaction not found'
-        except Exception as e:
-            logging.error(f"Error in process_refund: {str(e)}")
-            return None, 'An internal error has occurred.'
+    serializer = RefundSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=400)
 
     try:
-        item, error = await process_refund()
-        if error:
-            return Response({'error': 'An internal error has occurred.'}, status=404)
-
-        # Handle non-critical operations
-        async def async_operations():
-            try:
-                body = {
-                    'id': item.id,
-                    'product_name': item.product_name,
-                    'price': int(item.price),
-                    'quantity': item.quantity,
-                }
-                index.update_documents([body])
-                await cache.adelete('SHOP_STOCK')
-            except Exception as e:
-                logging.error(f"Error in async operations: {e}")
-
-        # Create background task
-        await asyncio.create_task(async_operations())
-
-        return Response({'message': 'Refund Successful'})
-
+        item, refund = await sync_to_async(refund_saved_transaction)(id, serializer.validated_data.get('quantity'))
+    except (SAVED_TRANSACTIONS2_FIX.DoesNotExist, SHOP2_STOCK_FIX.DoesNotExist) as e:
+        logging.error(f"Error in refund2_api: {str(e)}")
+        return Response({'error': 'An internal error has occurred.'}, status=404)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
     except Exception as e:
         logging.error(f"Error in refund2_api: {str(e)}")
         return Response({'error': 'An internal error has occurred.'}, status=500)
 
+    # Handle non-critical operations
+    async def async_operations():
+        try:
+            await cache.adelete(f'SHOP_STOCK_{item.id}')
+            await stock_changed(products=[item])
+        except Exception as e:
+            logging.error(f"Error in async operations: {e}")
+
+    # Create background task
+    await asyncio.create_task(async_operations())
+
+    return Response({'message': 'Refund Successful', 'refunded_quantity': refund.quantity,
+                     'stock_quantity': item.quantity})
+
 
 @api_view(['GET'])
 @authentication_classes([CeleryJWTAuthentication])
@@ -587,7 +808,7 @@ def detailed_low_stock(request):
     # Query items with quantity less than or equal to the threshold
     queryset = SHOP2_STOCK_FIX.objects.filter(quantity__lte=threshold).order_by('quantity')
 
-    paginator = StandardResultsSetPagination()
+    paginator = LowStockCursorPagination() if wants_cursor_pagination(request) else StandardResultsSetPagination()
     paginated_queryset = paginator.paginate_queryset(queryset, request)
 
     serializer = shop2_serializer(paginated_queryset, many=True)
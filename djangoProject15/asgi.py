@@ -12,4 +12,4 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoProject15.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
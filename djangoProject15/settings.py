@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'Alltechmanagement.apps.AlltechmanagementConfig',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -130,6 +131,9 @@ CORS_ALLOW_HEADERS = [
     'X-CSRFToken',
 ]
 CELERY_API_KEY = os.getenv('CELERY_KEY')
+# Server processes set this to load the authorized Firebase UIDs and Google's ID token
+# certificates in a background thread at startup (see Alltechmanagement.firebase_auth)
+FIREBASE_AUTH_PREWARM = os.getenv('FIREBASE_AUTH_PREWARM', '').lower() in ('1', 'true', 'yes')
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -274,16 +278,24 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        # At most one copy of each distinct message per minute
+        'sampled': {
+            '()': 'Alltechmanagement.log_handlers.SampledLogFilter',
+            'interval': 60,
+        },
+    },
     'handlers': {
+        # File writes happen on a background thread in batches, off the request path
         'django_file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'Alltechmanagement.log_handlers.QueuedFileHandler',
             'filename': 'django.log',
             'formatter': 'verbose',
         },
         'scheduler_file': {
             'level': 'DEBUG',
-            'class': 'logging.FileHandler',
+            'class': 'Alltechmanagement.log_handlers.QueuedFileHandler',
             'filename': 'scheduler.log',
             'formatter': 'verbose',
         },
@@ -304,6 +316,10 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'django.security.throttles': {
+            'filters': ['sampled'],
+            'propagate': True,
+        },
     },
 }
 